@@ -1,19 +1,22 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 import pandas as pd
 import os
 import sys
-import json
+import orjson
 import re
+import html
+import base64
 import requests
+import threading
 
 # --- PATH SETUP ---
 # Add the project root to the Python path to allow imports from `src`.
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.utils.utils import load_json
-from src.agent.main_agent import create_agent_executor
+from src.agent.main_agent import create_agent_executor, DEEP_ANALYSIS_MODEL
 from src.api_client.live_fetcher import fetch_and_analyze_player_data
-from src.analysis.plotter import plot_pathing_map, plot_death_locations, create_game_animation, plot_metric
 from src.agent.tools import (
     get_pro_build_for_champion, 
     get_comprehensive_game_analysis,
@@ -25,6 +28,25 @@ from src.agent.tools import (
 st.set_page_config(page_title="LoL Support Agent", layout="wide")
 
 # --- UI Functions ---
+def item_strip_html(items, width):
+    """
+    One HTML block for a row of item icons, given as (image_url, caption) pairs.
+    Much cheaper to render than a column and an st.image widget per item.
+    """
+    figures = "".join(
+        f'<figure style="margin:0;text-align:center;width:{width + 24}px">'
+        f'<img src="{html.escape(url)}" width="{width}" title="{html.escape(caption)}">'
+        f'<figcaption style="font-size:0.75em">{html.escape(caption)}</figcaption></figure>'
+        for url, caption in items if url
+    )
+    return f'<div style="display:flex;flex-wrap:wrap;gap:8px">{figures}</div>'
+
+@st.cache_data(show_spinner=False)
+def image_data_uri(path: str, mtime: float) -> str:
+    """Base64 data URI for a PNG, encoded once per version of the file instead of re-read by st.image on every rerun."""
+    with open(path, 'rb') as f:
+        return f"data:image/png;base64,{base64.b64encode(f.read()).decode()}"
+
 def display_game_analysis(analysis_data):
     """(Upgraded) Takes the analysis dictionary and displays it in a beautiful, structured UI."""
     summary = analysis_data.get("match_summary", {})
@@ -56,7 +78,8 @@ def display_game_analysis(analysis_data):
         st.subheader("Teamfight Positioning Map")
         map_path = analysis_data.get('teamfight_map_path')
         if map_path and os.path.exists(map_path):
-            st.image(map_path, caption="Blue '+' = Kills/Assists | Red '✖' = Deaths")
+            st.markdown(f'<img src="{image_data_uri(map_path, os.path.getmtime(map_path))}" style="max-width:100%">', unsafe_allow_html=True)
+            st.caption("Blue '+' = Kills/Assists | Red '✖' = Deaths")
         else:
             st.info("No combat data to generate a map for this game.")
     st.divider()
@@ -75,40 +98,71 @@ def display_game_analysis(analysis_data):
                     st.markdown(f"**{trip.get('timestamp_str')}**")
                 
                 with items_col:
-                    # Create sub-columns for the item images within the right column
-                    item_cols = st.columns(len(trip['items']))
-                    for i, item in enumerate(trip.get('items', [])):
-                        with item_cols[i]:
-                            st.image(item.get('image_url'), width=48, caption=item.get('name'))
+                    # All of the trip's items go out as a single HTML row
+                    st.markdown(item_strip_html(((item.get('image_url'), item.get('name', '')) for item in trip['items']), 48), unsafe_allow_html=True)
                 st.divider() # Add a small divider between each shopping trip
     else:
         st.info("No item purchase data was found for this match.")
 
 # --- DATA & AGENT LOADING ---
-@st.cache_data
-def load_pro_data():
-    return pd.DataFrame(load_json("data/pro_players_merged.json"))
+PRO_DATA_FILE = "data/pro_players_merged.json"
 
 @st.cache_resource
-def get_agent():
-    return create_agent_executor()
+def load_pro_champions(mtime: float) -> tuple[str, ...]:
+    """
+    Sorted champion names from the pro data, the only part the build explorer needs.
+    Keyed by the file's mtime so an updated pro file is picked up. Held as a shared
+    resource and returned as a tuple, so reruns get the same read-only object without a copy.
+    """
+    return tuple(sorted({game['champion'] for game in load_json(PRO_DATA_FILE) if 'champion' in game}))
 
-def _ms_to_min_sec(ms: int) -> str:
-    total_seconds = int(ms / 1000)
-    minutes = total_seconds // 60
-    seconds = total_seconds % 60
-    return f"{minutes:02d}:{seconds:02d}"
+@st.cache_resource
+def get_agent(deep_analysis: bool = False):
+    return create_agent_executor(DEEP_ANALYSIS_MODEL if deep_analysis else None)
 
 # Get the backend URL from an environment variable, with a fallback for local development
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+@st.cache_resource
+def _http() -> requests.Session:
+    """One pooled session shared by all backend calls, so sockets are reused between requests."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Backend responses are cached so re-selecting a game or champion doesn't rerun the tool chain.
+# Errors raise instead of returning, so they are never cached.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_game_analysis(backend: str, game_name: str, tag_line: str, match_id: str) -> dict:
+    response = _http().get(f"{backend}/analyze-game/{game_name}/{tag_line}/{match_id}", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_pro_build(backend: str, champion: str) -> dict:
+    response = _http().get(f"{backend}/pro-build/{champion}", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def _prefetch_pro_build(backend: str, champion: str):
+    """Fills the _fetch_pro_build cache in the background; failures are left for the build explorer to report."""
+    try: _fetch_pro_build(backend, champion)
+    except requests.exceptions.RequestException: pass
+
+# Plot paths the agent mentions in its answers, compiled once
+PLOT_PATH_PATTERN = re.compile(r"data/plots/[\w.-]+\.(?:png|gif)")
+
 # --- MAIN APP ---
 st.title("League of Legends Support Agent 🛡️")
 
 if 'user_games' not in st.session_state:
-    st.session_state.user_games = pd.DataFrame()
+    st.session_state.user_games = {}
 if 'current_user' not in st.session_state:
     st.session_state.current_user = None
+if 'game_options' not in st.session_state:
+    st.session_state.game_options = []
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -131,80 +185,95 @@ with st.sidebar:
                 existing_match_ids = {game['matchId'] for game in existing_games}
                 unique_new_games = [g for g in newly_fetched_games if g['matchId'] not in existing_match_ids]
                 combined_games = existing_games + unique_new_games
-                with open(user_file_path, 'w') as f: json.dump(combined_games, f, indent=4)
-                st.session_state.user_games = pd.DataFrame(combined_games)
+                # Only rewrite the history when something was added, as compact orjson output
+                if unique_new_games or not os.path.exists(user_file_path):
+                    with open(user_file_path, 'wb') as f: f.write(orjson.dumps(combined_games))
+                # Kept as plain records by matchId; the DataFrame is only built where the raw data is shown
+                st.session_state.user_games = {game['matchId']: game for game in combined_games}
+                # Built once per fetch so the game pickers don't rebuild them on every rerun
+                st.session_state.game_options = [f"{game.get('champion', 'Unknown')} - {game.get('matchId')}" for game in combined_games]
                 st.session_state.current_user = {"game_name": game_name, "tag_line": tag_line}
                 st.success(f"Added {len(unique_new_games)} new games for {game_name}#{tag_line}.")
             else:
                 st.error("Player not found. Please check your inputs.")
 
-# --- TABS FOR DISPLAY ---
-tabs = st.tabs([
-    "🤖 AI Coach", 
-    "📊 Game Analysis Dashboard", 
-    "🧪 New Agent Tools", 
-    "📂 Your Game Data", 
-    "⚡ Pro Player Build"
-])
+    st.header("AI Coach Settings")
+    st.toggle("Deep analysis", key="deep_analysis", help="Answer with the slower, more thorough Pro model instead of Flash.")
 
-with tabs[0]: # AI Coach
+# --- TAB CONTENTS ---
+# Each tab is a fragment, so interacting with one tab only reruns that tab
+
+@st.fragment
+def _ai_coach_tab():
     st.header("Chat with your AI Support Coach")
-    support_coach_agent = get_agent()
-    
-    if support_coach_agent is None:
-        st.error("The AI Coach could not be initialized. Please check your API keys and restart.")
-    elif st.session_state.current_user:
+    if st.session_state.current_user:
         st.info(f"Currently analyzing for user: **{st.session_state.current_user['game_name']}#{st.session_state.current_user['tag_line']}**")
         with st.form(key="chat_form"):
             user_question = st.text_area("Ask a specific question:", placeholder="e.g., Generate my pathing in my last game, or give me advice for using Thresh.")
             submit_button = st.form_submit_button(label="Get Advice")
 
         if submit_button and user_question:
-            current_user = st.session_state.current_user
-            contextual_prompt = (f"For the user with game_name='{current_user['game_name']}' and tag_line='{current_user['tag_line']}', answer the following question: {user_question}")
-            with st.spinner("The coach is thinking..."):
-                result = support_coach_agent.invoke({"input": contextual_prompt})
-                st.markdown(result['output'])
-
-                # Find and display any images the agent created
-                image_paths = re.findall(r"data/plots/[\w.-]+\.(?:png|gif)", result['output'])
-                if image_paths:
-                    for image_path in image_paths:
-                        if os.path.exists(image_path):
-                            st.image(image_path)
-                        else:
-                            st.warning(f"Agent mentioned an image, but it was not found at path: {image_path}")
+            # The agent is only built once someone actually asks a question
+            support_coach_agent = get_agent(st.session_state.deep_analysis)
+            if support_coach_agent is None:
+                st.error("The AI Coach could not be initialized. Please check your API keys and restart.")
+            else:
+                current_user = st.session_state.current_user
+                contextual_prompt = (f"For the user with game_name='{current_user['game_name']}' and tag_line='{current_user['tag_line']}', answer the following question: {user_question}")
+                output_placeholder = st.empty()
+                output_chunks = []
+                with st.spinner("The coach is thinking..."):
+                    # Stream the run so tool calls and the answer show up as they arrive
+                    for chunk in support_coach_agent.stream({"input": contextual_prompt}):
+                        for action in chunk.get("actions", []):
+                            output_placeholder.caption(f"Using tool `{action.tool}`...")
+                        if "output" in chunk:
+                            output_chunks.append(chunk["output"])
+                            output_placeholder.markdown("".join(output_chunks))
+                    output = "".join(output_chunks)
+
+                    # Find and display any images the agent created
+                    image_paths = PLOT_PATH_PATTERN.findall(output)
+                    if image_paths:
+                        for image_path in image_paths:
+                            if os.path.exists(image_path):
+                                st.image(image_path)
+                            else:
+                                st.warning(f"Agent mentioned an image, but it was not found at path: {image_path}")
     else:
         st.warning("Please fetch your game data from the sidebar to activate the AI Coach.")
 
-with tabs[1]: # Game Analysis Dashboard
+@st.fragment
+def _game_analysis_tab():
     st.header("Single Game Deep Dive")
-    if not st.session_state.user_games.empty and st.session_state.current_user:
-        user_games_df = st.session_state.user_games
-        descriptive_options = [f"{game.get('champion', 'Unknown')} - {game.get('matchId')}" for game in user_games_df.to_dict('records')]
-        selected_option = st.selectbox("Select one of your games to analyze:", options=descriptive_options)
+    if st.session_state.user_games and st.session_state.current_user:
+        selected_option = st.selectbox("Select one of your games to analyze:", options=st.session_state.game_options)
         
         if st.button("Analyze This Game"):
             if selected_option:
-                selected_match_id = selected_option.split(" - ")[1]
+                champion, selected_match_id = selected_option.split(" - ")[:2]
                 current_user = st.session_state.current_user
-                
+                # The champion's pro build is fetched alongside the analysis, so the build explorer has it ready
+                prefetch = threading.Thread(target=_prefetch_pro_build, args=(BACKEND_URL, champion), daemon=True)
+                add_script_run_ctx(prefetch)
+                prefetch.start()
+
                 with st.spinner(f"Performing analysis via API for {selected_match_id}..."):
-                    api_url = f"{BACKEND_URL}/analyze-game/{current_user['game_name']}/{current_user['tag_line']}/{selected_match_id}"
                     try:
-                        response = requests.get(api_url)
-                        if response.status_code == 200:
-                            analysis_result = response.json()
-                            display_game_analysis(analysis_result)
-                        else:
-                            st.error(f"Error from API: {response.json().get('detail', 'Unknown error')}")
+                        analysis_result = _fetch_game_analysis(BACKEND_URL, current_user['game_name'], current_user['tag_line'], selected_match_id)
+                        display_game_analysis(analysis_result)
+                    except requests.exceptions.HTTPError as e:
+                        st.error(f"Error from API: {e.response.json().get('detail', 'Unknown error')}")
+                    except requests.exceptions.Timeout:
+                        st.error("The API took too long to respond. Please try again.")
                     except requests.exceptions.ConnectionError:
                         st.error("Connection Error: Could not connect to the API. Is the backend server running?")
                         st.code("To run the backend, use this command in a new terminal:\n\nuvicorn backend.main:app --reload")
     else:
         st.info("Fetch your game data from the sidebar to begin analysis.")
 
-with tabs[2]: # New Agent Tools
+@st.fragment
+def _agent_tools_tab():
     st.header("New Feature Testing")
     if not st.session_state.current_user:
         st.warning("Please fetch your game data from the sidebar to use these tools.")
@@ -230,11 +299,8 @@ with tabs[2]: # New Agent Tools
 
         # --- 3. Gold Efficiency ---
         st.subheader("💰 Gold Efficiency Analysis")
-        if not st.session_state.user_games.empty:
-            # Create descriptive options for the dropdown
-            user_games_df = st.session_state.user_games
-            descriptive_options_gold = [f"{game.get('champion', 'Unknown')} - {game.get('matchId')}" for game in user_games_df.to_dict('records')]
-            selected_option_gold = st.selectbox("Select a Game for Gold Analysis", options=descriptive_options_gold, key="gold_eff_select")
+        if st.session_state.user_games:
+            selected_option_gold = st.selectbox("Select a Game for Gold Analysis", options=st.session_state.game_options, key="gold_eff_select")
             
             if st.button("Analyze Gold Efficiency"):
                 if selected_option_gold:
@@ -268,44 +334,59 @@ with tabs[2]: # New Agent Tools
                     st.write(f"Older Games Avg: {trend_data['average_of_first_half']} -> Newer Games Avg: {trend_data['average_of_second_half']}")
                     st.info(trend_data['insight'])
 
-with tabs[3]: # Raw Game Data
-    st.header("Your Full Game Data")
-    if not st.session_state.user_games.empty:
-        st.dataframe(st.session_state.user_games)
-    else:
-        st.info("No user data loaded.")
-
-with tabs[4]: # FastAPI
+@st.fragment
+def _pro_build_tab():
     st.header("Pro Player Build Explorer")
-    pro_df = load_pro_data()
+    champions = load_pro_champions(os.path.getmtime(PRO_DATA_FILE)) if os.path.exists(PRO_DATA_FILE) else ()
 
-    if pro_df.empty:
+    if not champions:
         st.warning("Pro player data is not available.")
     else:
-        champions = sorted(pro_df['champion'].unique())
         selected_champion_build = st.selectbox("Choose a champion to see their pro build:", options=champions)
 
         if selected_champion_build:
             with st.spinner(f"Finding most common build for {selected_champion_build}..."):
-                api_url = f"{BACKEND_URL}/pro-build/{selected_champion_build}"
                 try:
-                    response = requests.get(api_url)
-                    if response.status_code == 200:
-                        build_data = response.json()
-                        st.subheader(f"Most Common Pro Build for {build_data.get('champion')}")
-                        st.caption(f"Based on {build_data.get('games_analyzed')} pro games.")
-                        cols = st.columns(6)
-                        if build_data.get("boots") and build_data["boots"].get("image_url"):
-                            with cols[0]:
-                                st.image(build_data["boots"]["image_url"], width=64)
-                                st.caption(f"{build_data['boots']['name']}")
-                        for i, item in enumerate(build_data.get("core_items", [])):
-                            if i < 5 and item.get("image_url"):
-                                with cols[i+1]:
-                                    st.image(item["image_url"], width=64)
-                                    st.caption(f"{item['name']} ({item['popularity']})")
-                    else:
-                        st.error(f"Error fetching data from API: Status code {response.status_code}")
+                    build_data = _fetch_pro_build(BACKEND_URL, selected_champion_build)
+                    st.subheader(f"Most Common Pro Build for {build_data.get('champion')}")
+                    st.caption(f"Based on {build_data.get('games_analyzed')} pro games.")
+                    build_icons = []
+                    if build_data.get("boots"):
+                        build_icons.append((build_data["boots"].get("image_url"), build_data["boots"]["name"]))
+                    build_icons += [(item.get("image_url"), f"{item['name']} ({item['popularity']})") for item in build_data.get("core_items", [])[:5]]
+                    st.markdown(item_strip_html(build_icons, 64), unsafe_allow_html=True)
+                except requests.exceptions.HTTPError as e:
+                    st.error(f"Error fetching data from API: Status code {e.response.status_code}")
+                except requests.exceptions.Timeout:
+                    st.error("The API took too long to respond. Please try again.")
                 except requests.exceptions.ConnectionError as e:
                     st.error(f"Connection Error: Could not connect to the API. Is the backend server running?")
                     st.code("To run the backend, use this command in a new terminal: uvicorn backend.main:app --reload")
+
+# --- TABS FOR DISPLAY ---
+tabs = st.tabs([
+    "🤖 AI Coach", 
+    "📊 Game Analysis Dashboard", 
+    "🧪 New Agent Tools", 
+    "📂 Your Game Data", 
+    "⚡ Pro Player Build"
+])
+
+with tabs[0]: # AI Coach
+    _ai_coach_tab()
+
+with tabs[1]: # Game Analysis Dashboard
+    _game_analysis_tab()
+
+with tabs[2]: # New Agent Tools
+    _agent_tools_tab()
+
+with tabs[3]: # Raw Game Data
+    st.header("Your Full Game Data")
+    if st.session_state.user_games:
+        st.dataframe(pd.DataFrame(list(st.session_state.user_games.values())))
+    else:
+        st.info("No user data loaded.")
+
+with tabs[4]: # FastAPI
+    _pro_build_tab()
@@ -2,10 +2,12 @@
 
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 # Add project root to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.utils.utils import load_json
-from src.analysis.plotter import plot_roaming_trend, plot_death_locations, create_game_animation
+import matplotlib.pyplot as plt
+from src.analysis.plotter import OUTPUT_DIR, plot_pathing_map, plot_death_locations, create_game_animation
 
 # --- CONFIGURATION ---
 MERGED_DATA_PATH = "data/pro_players_merged.json"
@@ -16,6 +18,28 @@ GAMES_TO_PROCESS = 3
 
 # In generate_visuals.py
 
+def _base_filename(i, game):
+    """Descriptive base filename for a game's visuals: player, champion and match id."""
+    match_id = game.get("matchId", f"unknown_match_{i}")
+    champion = game.get("champion", "Unknown")
+    # Replace spaces with underscores for cleaner filenames
+    player_name = game.get("proPlayerName", "UnknownPlayer").replace(" ", "_")
+    return f"{player_name}_{champion}_{match_id}"
+
+def _plot_static_visuals(i, game):
+    """Pathing map and death location plots for one game. Lives at module level so worker processes can run it."""
+    base_filename = _base_filename(i, game)
+    print(f"\n--- Processing visuals for {game.get('matchId')} ({game.get('champion', 'Unknown')}) ---")
+
+    # 1. Generate the pathing map (the plotter names it after the match id)
+    plot_pathing_map(game)
+
+    # 2. Generate death location plot; it returns a figure, so save it under the descriptive name
+    fig = plot_death_locations([game])
+    if fig is not None:
+        fig.savefig(os.path.join(OUTPUT_DIR, f"{base_filename}_deaths.png"), bbox_inches='tight')
+        plt.close(fig)
+
 def main():
     """
     Main function to load data and generate visuals for each game.
@@ -30,26 +54,16 @@ def main():
     games_to_visualize = all_games[:GAMES_TO_PROCESS]
     print(f"Found {len(all_games)} total games. Processing the first {len(games_to_visualize)} games.")
 
-    for i, game in enumerate(games_to_visualize):
-        match_id = game.get("matchId", f"unknown_match_{i}")
-        champion = game.get("champion", "Unknown")
-        
-        # --- NEW: Get player name and create a descriptive base filename ---
-        # Replace spaces with underscores for cleaner filenames
-        player_name = game.get("proPlayerName", "UnknownPlayer").replace(" ", "_")
-        base_filename = f"{player_name}_{champion}_{match_id}"
-
-        print(f"\n--- Processing visuals for {match_id} ({champion}) ---")
-
-        # 1. Generate roaming trend plot with the new name
-        plot_roaming_trend(game, output_filename=f"{base_filename}_roaming.png")
-
-        # 2. Generate death location plot with the new name
-        plot_death_locations([game], output_filename=f"{base_filename}_deaths.png")
+    # Every game's static plots are independent, so they're spread across processes
+    num_workers = min(len(games_to_visualize), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(_plot_static_visuals, range(len(games_to_visualize)), games_to_visualize))
 
-        # 3. Generate GIF animation with the new name (if enabled)
-        if GENERATE_ANIMATIONS:
-            create_game_animation(game, output_filename=f"{base_filename}_animation.gif")
+    # 3. Generate GIF animations (if enabled). Each one already renders its frames on every core,
+    # so running them one game at a time avoids oversubscribing the machine.
+    if GENERATE_ANIMATIONS:
+        for i, game in enumerate(games_to_visualize):
+            create_game_animation(game, output_filename=f"{_base_filename(i, game)}_animation.gif")
 
     print("\n--- Visual generation complete! ---")
     print(f"Check the '{os.path.join('data', 'plots')}' directory for your files.")
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
@@ -20,6 +21,7 @@ from src.agent.tools import (
     analyze_objective_proximity,
     determine_playstyle,
     get_latest_match_id,
+    analyze_latest_game,
     generate_pathing_map_for_match,
     analyze_performance_trend,
     get_pro_matchup_advice,
@@ -29,9 +31,19 @@ from src.agent.tools import (
 # Load environment variables
 load_dotenv()
 
-def create_agent_executor():
+# Flash handles tool routing much faster; Pro is kept for explicitly requested deep analysis
+DEFAULT_MODEL = "gemini-1.5-flash"
+DEEP_ANALYSIS_MODEL = "gemini-1.5-pro-latest"
+
+@lru_cache(maxsize=2)
+def _llm(model: str):
+    """The agent's chat model, created once per model so every executor shares one client."""
+    return ChatGoogleGenerativeAI(model=model, temperature=0.2, convert_system_message_to_human=True)
+
+def create_agent_executor(model: str = None):
     """
     Creates and returns the LangChain agent executor, now with an improved prompt.
+    Uses `model` if given, otherwise the LLM_MODEL environment variable, otherwise Flash.
     """
     try:
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -47,11 +59,11 @@ def create_agent_executor():
             get_pro_build_for_champion, find_critical_moments_in_game, analyze_vision_control,
             analyze_build_path, analyze_teamfight_positioning, analyze_item_gold_spend,
             get_laning_phase_stats, get_common_skill_order_for_champion, determine_playstyle,
-            analyze_objective_proximity, get_latest_match_id, analyze_performance_trend,
+            analyze_objective_proximity, get_latest_match_id, analyze_latest_game, analyze_performance_trend,
             get_pro_matchup_advice, analyze_gold_efficiency
         ]
 
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0.2, convert_system_message_to_human=True)
+        llm = _llm(model or os.getenv("LLM_MODEL", DEFAULT_MODEL))
 
         # --- NEW, MORE INTELLIGENT PROMPT ---
         prompt = ChatPromptTemplate.from_messages([
@@ -59,6 +71,7 @@ def create_agent_executor():
                 "You are an expert League of Legends support coach. Your primary goal is to provide clear, actionable, and data-driven advice to players."
                 "BE PROACTIVE: Before you ask the user for information, first try to find it yourself using your tools. "
                 "For example, if the user asks about their 'last game' or 'latest match', you MUST use the 'get_latest_match_id' tool to find it. "
+                "If they want a full review of their latest game, use 'analyze_latest_game', which finds and analyzes it in one step. "
                 "Do not ask for the champion name if you can find it through the match data."
 
                 "CHAIN YOUR TOOLS: You can and should use the output of one tool as the input for another. "
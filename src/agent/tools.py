@@ -1,12 +1,14 @@
 # agent/tools.py
 
 import collections
+import copy
+import functools
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from src.utils.utils import load_json
-from src.analysis.plotter import plot_combat_heatmap, plot_pathing_map
-from itertools import groupby
 from operator import itemgetter
 import os
 
@@ -21,12 +23,116 @@ USER_DATA_DIR = "data/users/"
 # SECTION 1: PRIVATE HELPER FUNCTIONS
 # ==============================================================================
 
+def _latest_version_cache(maxsize: int):
+    """
+    Like functools.lru_cache for functions whose last argument is a file's mtime,
+    except only the newest mtime is kept per key (the other arguments). When the
+    file changes, the superseded entry is dropped before the new one is built
+    instead of lingering until evicted; the parsed pro data alone is ~120 MB.
+    """
+    def decorator(build):
+        entries = collections.OrderedDict()  # key -> (mtime, value)
+        lock = threading.Lock()
+
+        @functools.wraps(build)
+        def wrapper(*args):
+            key, mtime = args[:-1], args[-1]
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] == mtime:
+                    entries.move_to_end(key)
+                    return entry[1]
+                entries.pop(key, None)
+            value = build(*args)
+            with lock:
+                entries[key] = (mtime, value)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return value
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
+
 def _get_user_filepath(game_name: str, tag_line: str) -> str:
     sanitized_name = game_name.replace(" ", "_")
     return os.path.join(USER_DATA_DIR, f"{sanitized_name}_{tag_line}.json")
 
+@_latest_version_cache(maxsize=8)
+def _load_json_for_mtime(filepath: str, mtime: float):
+    return load_json(filepath)
+
+def _cached_load_json(filepath: str):
+    """
+    Parses a JSON data file once per process and returns the same object until
+    the file's mtime changes. The result is shared between calls: don't mutate it.
+    """
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError:
+        return load_json(filepath)
+    return _load_json_for_mtime(filepath, mtime)
+
+@_latest_version_cache(maxsize=4)
+def _item_lookup_for_mtime(filepath: str, mtime: float) -> dict:
+    return {int(item['id']): item for item in _cached_load_json(filepath)}
+
+def _get_item_lookup() -> dict:
+    """ Item id (int) -> item info, built once per version of the items file. """
+    try:
+        mtime = os.path.getmtime(ITEMS_DATA_FILE)
+    except OSError:
+        return {}
+    return _item_lookup_for_mtime(ITEMS_DATA_FILE, mtime)
+
+@_latest_version_cache(maxsize=1)
+def _pro_index_for_mtime(mtime: float) -> dict:
+    games_by_champion = collections.defaultdict(list)
+    for game in _cached_load_json(PRO_DATA_FILE):
+        games_by_champion[game.get("champion", "").casefold()].append(game)
+    return dict(games_by_champion)
+
+def _get_pro_games_by_champion() -> dict:
+    """ Casefolded champion name -> that champion's pro games, built once per version of the pro file. """
+    try:
+        mtime = os.path.getmtime(PRO_DATA_FILE)
+    except OSError:
+        return {}
+    return _pro_index_for_mtime(mtime)
+
+@_latest_version_cache(maxsize=1)
+def _pro_gpms_by_champion_for_mtime(mtime: float) -> dict:
+    """ Casefolded champion name -> GPM of every pro-game participant on it, in game order. """
+    gpms_by_champion = collections.defaultdict(list)
+    for game in _cached_load_json(PRO_DATA_FILE):
+        duration_minutes = game.get("gameDuration", 1) / 60
+        seen = set()
+        for p in game.get('allParticipants', []):
+            champion = p.get('championName', '').casefold()
+            # Only the first participant on a champion counts for each game
+            if champion in seen: continue
+            seen.add(champion)
+            gpms_by_champion[champion].append(p.get("goldEarned", 0) / duration_minutes if duration_minutes > 0 else 0)
+    return {champion: np.array(gpms) for champion, gpms in gpms_by_champion.items()}
+
+def _nearest_sample_indices(sample_ts: np.ndarray, query_ts: np.ndarray) -> np.ndarray:
+    """
+    For each query time, the index of the closest sample in the sorted `sample_ts`
+    (the earlier one on a tie), found by binary search instead of a linear scan.
+    """
+    if len(sample_ts) == 1:
+        return np.zeros(len(query_ts), dtype=np.intp)
+    right = np.clip(np.searchsorted(sample_ts, query_ts), 1, len(sample_ts) - 1)
+    left = right - 1
+    return np.where(query_ts - sample_ts[left] <= sample_ts[right] - query_ts, left, right)
+
 def _ms_to_min_sec(ms: int) -> str:
-    total_seconds = int(ms / 1000)
+    return _format_min_sec(int(ms) // 1000)
+
+@functools.lru_cache(maxsize=4096)
+def _format_min_sec(total_seconds: int) -> str:
+    # Keyed on whole seconds, so timestamps within the same second share one string
     minutes = total_seconds // 60
     seconds = total_seconds % 60
     return f"{minutes:02d}:{seconds:02d}"
@@ -38,24 +144,161 @@ METRIC_NAME_MAP = {
     "visionscoreperminute": "visionScorePerMinute", "vision_score_per_minute": "visionScorePerMinute"
 }
 
-def _get_average_stat_logic(filepath: str, metric: str, champion_name: str = None) -> float:
-    data = load_json(filepath)
-    if not data: return 0.0
-    metric_key = METRIC_NAME_MAP.get(metric.lower(), metric)
+@functools.lru_cache(maxsize=64)
+def _resolve_metric(metric: str) -> str:
+    """ Maps a user-facing metric alias (any case) to the stat key stored in the match data. """
+    return METRIC_NAME_MAP.get(metric.casefold(), metric)
+
+def _stat_table_cache_path(filepath: str) -> str:
+    """ Columnar sidecar next to a match-history file, e.g. data/users/Name_TAG.stats.npz """
+    return os.path.splitext(filepath)[0] + ".stats.npz"
+
+def _build_stat_table(filepath: str) -> dict:
+    data = _cached_load_json(filepath)
+    champions = np.array([(g.get("champion") or "").casefold() for g in data])
+    metric_keys = {k for g in data for k, v in g.items() if isinstance(v, (int, float))}
+    metrics = {
+        k: np.fromiter((v if isinstance(v := g.get(k, 0), (int, float)) else 0 for g in data), dtype=np.float32, count=len(data))
+        for k in metric_keys
+    }
+    return {"champions": champions, "metrics": metrics}
+
+def _group_rows_by_champion(champions: np.ndarray) -> dict:
+    """ Champion -> row indices of its games, in their original order. """
+    order = np.argsort(champions, kind='stable')
+    names, starts = np.unique(champions[order], return_index=True)
+    return dict(zip(names.tolist(), np.split(order, starts[1:])))
+
+@_latest_version_cache(maxsize=64)
+def _load_stat_table(filepath: str, mtime: float) -> dict:
+    """
+    Parses a match-history file once and stores every numeric stat as a
+    contiguous float32 column, alongside a casefolded champion column and
+    the row indices of each champion's games.
+    Keyed by mtime so a re-fetched user file is picked up automatically.
+    The columns are also saved to a .stats.npz sidecar, so a fresh process
+    can read them back without parsing the JSON (and its timelines) again.
+    """
+    cache_path = _stat_table_cache_path(filepath)
+    table = None
+    try:
+        with np.load(cache_path) as cached:
+            if float(cached["source_mtime"]) == mtime:
+                metrics = {k.removeprefix("metric__"): cached[k] for k in cached.files if k.startswith("metric__")}
+                table = {"champions": cached["champions"], "metrics": metrics}
+    except Exception:
+        pass  # Missing, stale-format, empty or truncated sidecar: rebuild it below
+
+    if table is None:
+        table = _build_stat_table(filepath)
+        # Written to a temp file and swapped in, so a process reading the sidecar
+        # (the app and the API can share it) never sees a half-written one
+        tmp_path = cache_path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, source_mtime=np.float64(mtime), champions=table["champions"],
+                         **{f"metric__{k}": v for k, v in table["metrics"].items()})
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # Read-only data directory: the in-memory table still works
+    table["champion_rows"] = _group_rows_by_champion(table["champions"])
+    return table
+
+def _get_stat_table(filepath: str) -> dict | None:
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError:
+        return None
+    return _load_stat_table(filepath, mtime)
+
+def _get_average_stats(filepath: str, metrics: tuple[str, ...], champion_name: str = None) -> dict:
+    """ Averages for several metrics from one table and champion lookup; 0.0 where data is missing. """
+    table = _get_stat_table(filepath)
+    if not table or len(table["champions"]) == 0: return dict.fromkeys(metrics, 0.0)
+    rows = None
     if champion_name:
-        filtered_games = [g for g in data if g.get("champion", "").lower() == champion_name.lower()]
-    else:
-        filtered_games = data
-    if not filtered_games: return 0.0
-    values = [game.get(metric_key, 0) for game in filtered_games]
-    return np.mean(values) if values else 0.0
+        rows = table["champion_rows"].get(champion_name.casefold())
+        if rows is None: return dict.fromkeys(metrics, 0.0)
+    averages = {}
+    for metric in metrics:
+        values = table["metrics"].get(_resolve_metric(metric))
+        if values is None:
+            averages[metric] = 0.0
+            continue
+        if rows is not None: values = values[rows]
+        # Accumulate in float64 so the float32 storage doesn't cost precision
+        averages[metric] = float(values.mean(dtype=np.float64))
+    return averages
+
+def _get_average_stat_logic(filepath: str, metric: str, champion_name: str = None) -> float:
+    return _get_average_stats(filepath, (metric,), champion_name)[metric]
+
+@_latest_version_cache(maxsize=16)
+def _user_matches_by_id_for_mtime(filepath: str, mtime: float) -> dict:
+    matches_by_id = {}
+    for match in _cached_load_json(filepath):
+        matches_by_id.setdefault(match.get("matchId"), match)
+    return matches_by_id
 
 def _get_user_match_data(game_name: str, tag_line: str, match_id: str) -> dict | None:
+    """ Looks a match up by id in an index built once per version of the user's file. """
     filepath = _get_user_filepath(game_name, tag_line)
-    user_data = load_json(filepath)
-    if not user_data:
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError:
         return None
-    return next((match for match in user_data if match.get("matchId") == match_id), None)
+    return _user_matches_by_id_for_mtime(filepath, mtime).get(match_id)
+
+def _single_pass_match_summary(match_data: dict, item_lookup: dict) -> dict:
+    """
+    Walks each event list of a match exactly once and gathers everything the
+    build, gold, vision and laning tools need, so a full game analysis
+    doesn't re-scan the same events for every section.
+    """
+    gold_spent = 0
+    purchases = []
+    for event in match_data.get("item_events", []):
+        if event.get("type") != "ITEM_PURCHASED": continue
+        item_info = item_lookup.get(event.get("itemId"))
+        if item_info:
+            gold_spent += item_info.get("cost", 0)
+            purchases.append({"timestamp": event.get("timestamp", 0), "name": item_info.get("name"), "image_url": item_info.get("image_url")})
+
+    control_wards = stealth_wards = 0
+    for event in match_data.get("vision_events", []):
+        if event.get('type') != 'PLACED': continue
+        ward_type = event.get('ward_type')
+        if ward_type == 'CONTROL_WARD': control_wards += 1
+        elif ward_type == 'SIGHT_WARD': stealth_wards += 1
+
+    laning_phase_limit = 15 * 60 * 1000
+    laning_kills = laning_assists = 0
+    for event in match_data.get("combat_events", []):
+        if event.get('timestamp', 0) > laning_phase_limit: continue
+        event_type = event.get('type')
+        if event_type == 'KILL': laning_kills += 1
+        elif event_type == 'ASSIST': laning_assists += 1
+
+    deaths_in_lane = sum(1 for d in match_data.get("death_positions", []) if d.get("timestamp", 0) <= 840000)
+
+    return {"gold_spent": gold_spent, "purchases": purchases, "control_wards": control_wards, "stealth_wards": stealth_wards,
+            "laning_kills": laning_kills, "laning_assists": laning_assists, "deaths_in_lane": deaths_in_lane}
+
+def _build_path_report(match_data: dict, summary: dict) -> list[dict]:
+    if not match_data.get("item_events"): return [{"error": "No item purchase events found."}]
+    purchases = summary["purchases"]
+    if not purchases: return [{"error": "No valid item purchases found."}]
+    # Purchases made at the same timestamp form one shopping trip (dicts keep insertion order)
+    trips = {}
+    for purchase in purchases:
+        trips.setdefault(purchase['timestamp'], []).append(purchase)
+    return [{"timestamp_str": _ms_to_min_sec(timestamp), "items": items_in_trip} for timestamp, items_in_trip in trips.items()]
+
+def _vision_report(match_data: dict, summary: dict) -> dict:
+    return {"vision_score": match_data.get("visionScore", 0), "wards_placed": match_data.get("wardsPlaced", 0), "wards_killed": match_data.get("wardsKilled", 0), "control_wards_bought": match_data.get("visionWardsBoughtInGame", 0), "control_wards_placed": summary["control_wards"], "stealth_wards_placed": summary["stealth_wards"]}
+
+def _laning_phase_report(match_data: dict, summary: dict) -> dict:
+    return {"deaths_before_14_mins": summary["deaths_in_lane"], "ward_takedowns_before_20_mins": match_data.get("wardTakedownsBefore20M", 0)}
 
 # ==============================================================================
 # SECTION 2: AGENT TOOLS
@@ -70,18 +313,15 @@ def get_pro_player_average_stat(metric: str, champion_name: str = None) -> float
 def get_user_average_stat(game_name: str, tag_line: str, metric: str, champion_name: str = None) -> float:
     """Calculates the average for a metric for a GIVEN USER from their personal match history."""
     filepath = _get_user_filepath(game_name, tag_line)
-    return _get_average_stat_logic(filepath, metric, champion_name, is_pro=False)
+    return _get_average_stat_logic(filepath, metric, champion_name)
 
 @tool
 def determine_playstyle(champion_name: str, game_name: str, tag_line: str) -> dict:
     """Analyzes a user's playstyle on a champion by comparing their stats to the pro average."""
-    user_filepath = _get_user_filepath(game_name, tag_line)
-    user_vision = get_user_average_stat.func(game_name, tag_line, 'visionScore', champion_name)
-    pro_vision = get_pro_player_average_stat.func('visionScore', champion_name)
-    user_kp = get_user_average_stat.func(game_name, tag_line, 'killParticipation', champion_name)
-    pro_kp = get_pro_player_average_stat.func('killParticipation', champion_name)
-    user_deaths = get_user_average_stat.func(game_name, tag_line, 'deaths', champion_name)
-    pro_deaths = get_pro_player_average_stat.func('deaths', champion_name)
+    # One table and champion lookup per side covers all three metrics
+    metrics = ('visionScore', 'killParticipation', 'deaths')
+    user_vision, user_kp, user_deaths = _get_average_stats(_get_user_filepath(game_name, tag_line), metrics, champion_name).values()
+    pro_vision, pro_kp, pro_deaths = _get_average_stats(PRO_DATA_FILE, metrics, champion_name).values()
 
     if user_vision == 0 or pro_vision == 0:
         return {"error": f"Not enough data for {champion_name} to determine a playstyle."}
@@ -101,39 +341,46 @@ def determine_playstyle(champion_name: str, game_name: str, tag_line: str) -> di
         evidence.append("Your stats are very similar to pro averages.")
     return {"inferred_playstyle": playstyle, "supporting_evidence": " ".join(evidence)}
 
-@tool
-def get_best_champions_from_pros(sort_by: str = "win_rate", top_n: int = 5) -> list[dict]:
-    """Finds and ranks pro support champions from the database based on a chosen metric (win_rate or games_played)."""
-    pro_data = load_json(PRO_DATA_FILE)
-    if not pro_data: return []
-    pro_data.sort(key=itemgetter('champion'))
+@functools.lru_cache(maxsize=4)
+def _ranked_pro_champions_for_mtime(sort_by: str, mtime: float) -> tuple[dict, ...]:
+    """ Every pro champion with at least 5 games, ranked by `sort_by`. Computed once per version of the pro file. """
     champion_stats = []
-    for champion, games in groupby(pro_data, key=itemgetter('champion')):
-        games_list = list(games)
+    # Visit champions alphabetically so ties keep a stable order after ranking
+    for games_list in sorted(_pro_index_for_mtime(mtime).values(), key=lambda games: games[0].get('champion', '')):
+        champion = games_list[0].get('champion', '')
         games_played = len(games_list)
         if games_played >= 5:
             wins = sum(1 for game in games_list if game.get('win'))
             win_rate = wins / games_played
             champion_stats.append({"champion": champion, "win_rate": win_rate, "games_played": games_played})
+    return tuple(sorted(champion_stats, key=itemgetter(sort_by), reverse=True))
+
+@tool
+def get_best_champions_from_pros(sort_by: str = "win_rate", top_n: int = 5) -> list[dict]:
+    """Finds and ranks pro support champions from the database based on a chosen metric (win_rate or games_played)."""
+    if not _get_pro_games_by_champion(): return []
     if sort_by not in ["win_rate", "games_played"]:
         return [{"error": "Invalid sort_by value. Must be 'win_rate' or 'games_played'."}]
-    sorted_champs = sorted(champion_stats, key=itemgetter(sort_by), reverse=True)
-    return sorted_champs[:top_n]
+    ranked = _ranked_pro_champions_for_mtime(sort_by, os.path.getmtime(PRO_DATA_FILE))
+    # Hand out copies so callers can't alter the cached ranking
+    return [dict(champ) for champ in ranked[:top_n]]
 
 @tool
 def get_pro_build_for_champion(champion_name: str) -> dict:
     """Finds the most common item build for a champion from the pro database."""
-    pro_data = load_json(PRO_DATA_FILE)
-    items_list = load_json(ITEMS_DATA_FILE)
-    if not pro_data or not items_list: return {"error": "Could not load data."}
-    item_lookup = {str(item['id']): item for item in items_list}
-    champion_games = [g for g in pro_data if g.get("champion", "").lower() == champion_name.lower()]
+    games_by_champion = _get_pro_games_by_champion()
+    item_lookup = _get_item_lookup()
+    if not games_by_champion or not item_lookup: return {"error": "Could not load data."}
+    champion_games = games_by_champion.get(champion_name.casefold(), [])
     if not champion_games: return {"error": f"No games found for champion {champion_name}."}
-    all_items = [str(game.get(f"item{i}", 0)) for game in champion_games for i in range(6) if game.get(f"item{i}", 0) != 0]
-    item_counts = collections.Counter(all_items)
+    # Histogram of the integer item ids, most common first (ties keep first-seen order, like Counter)
+    all_items = np.fromiter((game.get(f"item{i}", 0) for game in champion_games for i in range(6)), dtype=np.int32, count=6 * len(champion_games))
+    item_ids, first_seen, counts = np.unique(all_items[all_items != 0], return_index=True, return_counts=True)
+    order = np.lexsort((first_seen, -counts))
     build = {"champion": champion_name.title(), "games_analyzed": len(champion_games), "boots": None, "core_items": []}
     core_items = []
-    for item_id, count in item_counts.most_common():
+    for item_id, count in zip(item_ids[order].tolist(), counts[order].tolist()):
+        if build["boots"] and len(core_items) == 5: break
         item_info = item_lookup.get(item_id)
         if not item_info: continue
         item_name = item_info.get("name")
@@ -150,34 +397,24 @@ def analyze_build_path(match_id: str, game_name: str, tag_line: str) -> list[dic
     """Shows the chronological order of items purchased for a user in a specific match."""
     match_data = _get_user_match_data(game_name, tag_line, match_id)
     if not match_data: return [{"error": f"Match {match_id} not found."}]
-    items_list = load_json(ITEMS_DATA_FILE)
-    item_lookup = {str(item['id']): item for item in items_list}
-    item_events = match_data.get("item_events", [])
-    if not item_events: return [{"error": "No item purchase events found."}]
-    purchases = []
-    for event in item_events:
-        if event.get("type") == "ITEM_PURCHASED":
-            item_id = str(event.get("itemId"))
-            item_info = item_lookup.get(item_id)
-            if item_info:
-                purchases.append({"timestamp": event.get("timestamp", 0), "name": item_info.get("name"), "image_url": item_info.get("image_url")})
-    if not purchases: return [{"error": "No valid item purchases found."}]
-    build_path = []
-    for timestamp, group in groupby(purchases, key=lambda x: x['timestamp']):
-        items_in_trip = list(group)
-        build_path.append({"timestamp_str": _ms_to_min_sec(timestamp), "items": items_in_trip})
-    return build_path
+    summary = _single_pass_match_summary(match_data, _get_item_lookup())
+    return _build_path_report(match_data, summary)
 
 @tool
 def analyze_item_gold_spend(match_id: str, game_name: str, tag_line: str) -> dict:
     """Analyzes item purchases for a user in a specific match to calculate gold spent."""
     match_data = _get_user_match_data(game_name, tag_line, match_id)
     if not match_data: return {"error": f"Match {match_id} not found."}
-    items_list = load_json(ITEMS_DATA_FILE)
-    item_lookup = {str(item['id']): item for item in items_list}
-    total_gold_spent = sum(item_lookup.get(str(e.get("itemId")), {}).get("cost", 0) for e in match_data.get("item_events", []) if e.get("type") == "ITEM_PURCHASED")
-    final_build_cost = sum(item_lookup.get(str(match_data.get(f"item{i}")), {}).get("cost", 0) for i in range(7))
-    final_build_items = [item_lookup.get(str(match_data.get(f"item{i}")), {}).get("name") for i in range(7) if match_data.get(f"item{i}")]
+    item_lookup = _get_item_lookup()
+    total_gold_spent = _single_pass_match_summary(match_data, item_lookup)["gold_spent"]
+    # One walk over the final item slots gives both the cost and the names
+    final_build_cost, final_build_items = 0, []
+    for i in range(7):
+        item_id = match_data.get(f"item{i}")
+        if not item_id: continue
+        item_info = item_lookup.get(item_id, {})
+        final_build_cost += item_info.get("cost", 0)
+        final_build_items.append(item_info.get("name"))
     return {"total_gold_spent_on_purchases": total_gold_spent, "final_build_cost": final_build_cost, "final_build_items": final_build_items}
 
 @tool
@@ -185,14 +422,14 @@ def analyze_vision_control(match_id: str, game_name: str, tag_line: str) -> dict
     """Provides a detailed report on vision control for a user in a specific match."""
     match_data = _get_user_match_data(game_name, tag_line, match_id)
     if not match_data: return {"error": f"Match {match_id} not found."}
-    vision_events = match_data.get("vision_events", [])
-    return {"vision_score": match_data.get("visionScore", 0), "wards_placed": match_data.get("wardsPlaced", 0), "wards_killed": match_data.get("wardsKilled", 0), "control_wards_bought": match_data.get("visionWardsBoughtInGame", 0), "control_wards_placed": sum(1 for e in vision_events if e.get('type') == 'PLACED' and e.get('ward_type') == 'CONTROL_WARD'), "stealth_wards_placed": sum(1 for e in vision_events if e.get('type') == 'PLACED' and e.get('ward_type') == 'SIGHT_WARD')}
+    return _vision_report(match_data, _single_pass_match_summary(match_data, _get_item_lookup()))
 
 @tool
 def analyze_teamfight_positioning(match_id: str, game_name: str, tag_line: str) -> str:
     """Generates a map visualizing where a user got kills/assists versus where they died in a specific match."""
     match_data = _get_user_match_data(game_name, tag_line, match_id)
     if not match_data: return f"Match {match_id} not found."
+    from src.analysis.plotter import plot_combat_heatmap  # matplotlib is only loaded once a map is needed
     output_path = plot_combat_heatmap(match_data)
     return f"Positioning map generated: {output_path}" if output_path else "Could not generate map."
 
@@ -204,15 +441,21 @@ def find_critical_moments_in_game(game_name: str, tag_line: str, match_id: str)
     death_events = match_data.get("death_positions", [])
     objective_events = match_data.get("enemy_objective_takes", [])
     if not death_events: return ["No deaths found in this game. Great job!"]
+    # Sort the objectives by time once so each death's window is a binary search
+    obj_ts = np.fromiter((o.get("timestamp", 0) for o in objective_events), dtype=np.int64, count=len(objective_events))
+    order = np.argsort(obj_ts, kind='stable')
+    obj_ts = obj_ts[order]
+    objectives = [objective_events[i] for i in order]
+    death_ts = np.fromiter((d.get("timestamp", 0) for d in death_events), dtype=np.int64, count=len(death_events))
+    # Every death's (death, death + 60s] window is found in two vectorized searches
+    window_starts = np.searchsorted(obj_ts, death_ts, side='right').tolist()
+    window_ends = np.searchsorted(obj_ts, death_ts + 60000, side='right').tolist()
     critical_moments = []
-    for death in death_events:
-        death_time = death.get("timestamp", 0)
-        for objective in objective_events:
-            obj_time = objective.get("timestamp", 0)
-            if 0 < (obj_time - death_time) <= 60000:
-                obj_type = objective.get("type", "Objective").replace("_", " ").title()
-                moment = (f"At {_ms_to_min_sec(death_time)}, a death was followed by the enemy taking a {obj_type} within a minute. This suggests the death created a critical opening.")
-                critical_moments.append(moment)
+    for death_time, lo, hi in zip(death_ts.tolist(), window_starts, window_ends):
+        for objective in objectives[lo:hi]:
+            obj_type = objective.get("type", "Objective").replace("_", " ").title()
+            moment = (f"At {_ms_to_min_sec(death_time)}, a death was followed by the enemy taking a {obj_type} within a minute. This suggests the death created a critical opening.")
+            critical_moments.append(moment)
     return critical_moments if critical_moments else ["No critical moments found."]
 
 @tool
@@ -220,25 +463,35 @@ def get_laning_phase_stats(match_id: str, game_name: str, tag_line: str) -> dict
     """Provides key statistics about the laning phase (first 14 minutes) for a user in a given match."""
     match_data = _get_user_match_data(game_name, tag_line, match_id)
     if not match_data: return {"error": f"Match {match_id} not found."}
-    deaths_in_lane = sum(1 for d in match_data.get("death_positions", []) if d.get("timestamp", 0) <= 840000)
-    return {"deaths_before_14_mins": deaths_in_lane, "ward_takedowns_before_20_mins": match_data.get("wardTakedownsBefore20M", 0)}
+    return _laning_phase_report(match_data, _single_pass_match_summary(match_data, _get_item_lookup()))
+
+@functools.lru_cache(maxsize=128)
+def _common_skill_order_for_mtime(champion_key: str, mtime: float) -> tuple[str, ...] | None:
+    """
+    Most common skill slot at each of the first 11 levels, over the champion's pro games.
+    Only the skill orders are read, in a single pass. None when the champion has no
+    pro games, an empty tuple when none of them recorded a skill order.
+    """
+    champion_games = _pro_index_for_mtime(mtime).get(champion_key)
+    if not champion_games: return None
+    level_counts = [collections.Counter() for _ in range(11)]
+    for game in champion_games:
+        for level, slot in enumerate(game.get("skill_level_order", [])[:11]):
+            level_counts[level][slot] += 1
+    skill_map = {1: 'Q', 2: 'W', 3: 'E', 4: 'R'}
+    common_order = []
+    for counts in level_counts:
+        if not counts: break
+        common_order.append(skill_map.get(counts.most_common(1)[0][0], '?'))
+    return tuple(common_order)
 
 @tool
 def get_common_skill_order_for_champion(champion_name: str) -> str:
     """Finds the most common skill leveling order for a specific champion from pro games."""
-    pro_data = load_json(PRO_DATA_FILE)
-    if not pro_data: return f"Could not load pro player data to analyze {champion_name}."
-    champion_games = [game for game in pro_data if game.get("champion", "").lower() == champion_name.lower()]
-    if not champion_games: return f"No games found for {champion_name} in the database."
-    all_skill_orders = [order for order in [game.get("skill_level_order", []) for game in champion_games] if order]
-    if not all_skill_orders: return f"Skill level data is missing for {champion_name} games."
-    common_order = []
-    skill_map = {1: 'Q', 2: 'W', 3: 'E', 4: 'R'}
-    for level in range(11):
-        skills_at_this_level = [order[level] for order in all_skill_orders if len(order) > level]
-        if not skills_at_this_level: break
-        most_common_skill_slot = collections.Counter(skills_at_this_level).most_common(1)[0][0]
-        common_order.append(skill_map.get(most_common_skill_slot, '?'))
+    if not _get_pro_games_by_champion(): return f"Could not load pro player data to analyze {champion_name}."
+    common_order = _common_skill_order_for_mtime(champion_name.casefold(), os.path.getmtime(PRO_DATA_FILE))
+    if common_order is None: return f"No games found for {champion_name} in the database."
+    if not common_order: return f"Skill level data is missing for {champion_name} games."
     return " -> ".join(common_order)
 
 @tool
@@ -256,53 +509,99 @@ def analyze_objective_proximity(match_id: str, game_name: str, tag_line: str) ->
     if not all_objectives: return ["No Dragon or Baron takes were found in this game's timeline data."]
     pathing_data = match_data.get("full_game_pathing")
     if not pathing_data: return ["No pathing data available to analyze proximity."]
+    objectives = sorted(all_objectives, key=itemgetter('timestamp'))
+    path_ts = np.fromiter((p['timestamp'] for p in pathing_data), dtype=np.int64, count=len(pathing_data))
+    path_xy = np.array([(p['position']['x'], p['position']['y']) for p in pathing_data], dtype=np.int64)
+    obj_ts = np.fromiter((obj.get("timestamp", 0) for obj in objectives), dtype=np.int64, count=len(objectives))
+    obj_xy = np.array([(obj['position']['x'], obj['position']['y']) for obj in objectives], dtype=np.int64)
+    nearest = _nearest_sample_indices(path_ts, obj_ts)
+    # Only the thresholds matter here, so compare exact integer squared distances and skip the sqrt
+    distances_sq = ((path_xy[nearest] - obj_xy) ** 2).sum(axis=1)
     insights = []
-    for obj in sorted(all_objectives, key=itemgetter('timestamp')):
-        obj_time = obj.get("timestamp", 0)
+    for obj, obj_time, distance_sq in zip(objectives, obj_ts.tolist(), distances_sq.tolist()):
         obj_type = obj.get("type", "Objective").replace("_", " ").title()
-        obj_pos = obj.get("position", {})
-        closest_path_point = min(pathing_data, key=lambda p: abs(p['timestamp'] - obj_time))
-        player_pos = closest_path_point.get("position")
-        if not player_pos: continue
-        distance = np.linalg.norm(np.array([player_pos['x'], player_pos['y']]) - np.array([obj_pos['x'], obj_pos['y']]))
-        position_insight = "You were present at the objective." if distance < 3000 else "You were on the opposite side of the map." if distance > 8000 else "You were nearby, but not directly at the objective."
+        position_insight = "You were present at the objective." if distance_sq < 3000 ** 2 else "You were on the opposite side of the map." if distance_sq > 8000 ** 2 else "You were nearby, but not directly at the objective."
         insights.append(f"At {_ms_to_min_sec(obj_time)}, the {obj['team']} team took a {obj_type}. {position_insight}")
     return insights if insights else ["No relevant objective insights found."]
 
+@_latest_version_cache(maxsize=16)
+def _game_reports_for_mtime(filepath: str, mtime: float) -> dict:
+    """
+    match_id -> report for one version of a user's file, filled in as reports are requested.
+    Reports reference the parsed file, so they're all dropped together when the file changes.
+    """
+    return {}
+
+def _game_report_for_mtime(filepath: str, match_id: str, mtime: float) -> dict:
+    """ Text sections of a game report. A finished match never changes, so they're reused until the user's file does. """
+    reports = _game_reports_for_mtime(filepath, mtime)
+    report = reports.get(match_id)
+    if report is None:
+        report = reports[match_id] = _build_game_report(filepath, match_id, mtime)
+    return report
+
+def _build_game_report(filepath: str, match_id: str, mtime: float) -> dict:
+    match_data = _user_matches_by_id_for_mtime(filepath, mtime).get(match_id)
+    # One pass over the events feeds every section of the report
+    summary = _single_pass_match_summary(match_data, _get_item_lookup())
+    laning_stats = _laning_phase_report(match_data, summary)
+    laning_stats['laning_kills'] = summary["laning_kills"]
+    laning_stats['laning_assists'] = summary["laning_assists"]
+    build_path = _build_path_report(match_data, summary)
+    vision_report = _vision_report(match_data, summary)
+    vision_report['vision_events_log'] = match_data.get("vision_events", [])
+    return {"match_summary": {"champion": match_data.get("champion"), "win": match_data.get("win"), "kills": match_data.get("kills"), "deaths": match_data.get("deaths"), "assists": match_data.get("assists"), "visionScore": match_data.get("visionScore")}, "laning_phase": laning_stats, "build_path": build_path, "vision_report": vision_report}
+
 def get_comprehensive_game_analysis(match_id: str, game_name: str, tag_line: str) -> dict:
     """Performs a full analysis of a single game for a given user."""
-    match_data = _get_user_match_data(game_name, tag_line, match_id)
+    filepath = _get_user_filepath(game_name, tag_line)
+    try:
+        mtime = os.path.getmtime(filepath)
+    except OSError:
+        return {"error": f"Match {match_id} not found."}
+    match_data = _user_matches_by_id_for_mtime(filepath, mtime).get(match_id)
     if not match_data: return {"error": f"Match {match_id} not found."}
-    laning_phase_limit = 15 * 60 * 1000
-    laning_kills = sum(1 for e in match_data.get("combat_events", []) if e['type'] == 'KILL' and e['timestamp'] <= laning_phase_limit)
-    laning_assists = sum(1 for e in match_data.get("combat_events", []) if e['type'] == 'ASSIST' and e['timestamp'] <= laning_phase_limit)
-    laning_stats = get_laning_phase_stats.func(match_id, game_name, tag_line)
-    laning_stats['laning_kills'] = laning_kills
-    laning_stats['laning_assists'] = laning_assists
-    build_path = analyze_build_path.func(match_id, game_name, tag_line)
-    vision_report = analyze_vision_control.func(match_id, game_name, tag_line)
-    teamfight_map_path = plot_combat_heatmap(match_data)
-    vision_report['vision_events_log'] = match_data.get("vision_events", [])
-    analysis_report = {"match_summary": {"champion": match_data.get("champion"), "win": match_data.get("win"), "kills": match_data.get("kills"), "deaths": match_data.get("deaths"), "assists": match_data.get("assists"), "visionScore": match_data.get("visionScore")}, "laning_phase": laning_stats, "build_path": build_path, "vision_report": vision_report, "teamfight_map_path": teamfight_map_path}
-    return analysis_report
+    from src.analysis.plotter import plot_combat_heatmap  # matplotlib is only loaded once a map is needed
+    # Rendering the map dominates, so it runs in the background while the text sections are built.
+    # It stays outside the report cache so a deleted map image gets drawn again.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        map_future = executor.submit(plot_combat_heatmap, match_data)
+        analysis_report = _game_report_for_mtime(filepath, match_id, mtime)
+        teamfight_map_path = map_future.result()
+    # Deep-copied so a caller mutating its report can't corrupt the cached one (or the parsed match data it references)
+    return {**copy.deepcopy(analysis_report), "teamfight_map_path": teamfight_map_path}
+
+def _latest_match_id(game_name: str, tag_line: str):
+    """matchId of the user's most recent game, or None if there is no usable history."""
+    user_data = _cached_load_json(_get_user_filepath(game_name, tag_line))
+    if not user_data: return None
+    try:
+        return user_data[-1].get('matchId')
+    except (IndexError, TypeError, KeyError):
+        return None
 
 @tool
 def get_latest_match_id(game_name: str, tag_line: str) -> str:
     """Finds and returns the match_id of the most recent game from a user's match history."""
     filepath = _get_user_filepath(game_name, tag_line)
-    user_data = load_json(filepath)
+    user_data = _cached_load_json(filepath)
     if not user_data: return "No user data found. Please fetch games first."
-    try:
-        latest_game = user_data[-1]
-        return latest_game.get('matchId')
-    except (IndexError, TypeError, KeyError):
-        return "Could not determine the latest game from the available data."
+    return _latest_match_id(game_name, tag_line) or "Could not determine the latest game from the available data."
+
+@tool
+def analyze_latest_game(game_name: str, tag_line: str) -> dict:
+    """Performs a full analysis of the user's most recent game. Use this instead of chaining get_latest_match_id into other tools."""
+    # Runs the lookup and the analysis in one call, saving the agent a round trip through the LLM
+    match_id = _latest_match_id(game_name, tag_line)
+    if not match_id: return {"error": "No games found for this user. Please fetch games first."}
+    return get_comprehensive_game_analysis(match_id, game_name, tag_line)
 
 @tool
 def generate_pathing_map_for_match(match_id: str, game_name: str, tag_line: str) -> str:
     """Generates a color-coded pathing map for a user's specific game."""
     match_data = _get_user_match_data(game_name, tag_line, match_id)
     if not match_data: return f"Could not find data for match {match_id}."
+    from src.analysis.plotter import plot_pathing_map  # matplotlib is only loaded once a map is needed
     output_path = plot_pathing_map(match_data)
     if output_path and os.path.exists(output_path):
         return f"Pathing map for match {match_id} has been generated and saved to {output_path}"
@@ -313,9 +612,9 @@ def generate_pathing_map_for_match(match_id: str, game_name: str, tag_line: str)
 def analyze_performance_trend(game_name: str, tag_line: str, metric: str, num_games: int = 10) -> dict:
     """Analyzes a user's performance trend for a specific metric over their last N games."""
     filepath = _get_user_filepath(game_name, tag_line)
-    data = load_json(filepath)
+    data = _cached_load_json(filepath)
     if not data or len(data) < 3: return {"error": "Not enough game data found to analyze a trend. Need at least 3 games."}
-    metric_key = METRIC_NAME_MAP.get(metric.lower(), metric)
+    metric_key = _resolve_metric(metric)
     recent_games = data[-num_games:]
     if len(recent_games) < 3: return {"error": f"Not enough recent games to analyze a trend. Need at least 3, found {len(recent_games)}."}
     values = [game.get(metric_key, 0) for game in recent_games]
@@ -328,6 +627,11 @@ def analyze_performance_trend(game_name: str, tag_line: str, metric: str, num_ga
     elif avg_second_half < avg_first_half * 0.95: trend = "Downward"
     return {"metric": metric_key, "trend": trend, "games_analyzed": len(values), "average_of_first_half": f"{avg_first_half:.2f}", "average_of_second_half": f"{avg_second_half:.2f}", "insight": f"Your performance for '{metric_key}' is on a(n) {trend.lower()} trend over the last {len(values)} games."}
 
+@functools.lru_cache(maxsize=1)
+def _matchup_llm():
+    """Built once per process, so every matchup request reuses the same client and its connections."""
+    return ChatGoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0.3)
+
 @tool
 def get_pro_matchup_advice(your_champion: str, enemy_champion: str) -> dict:
     """
@@ -335,8 +639,8 @@ def get_pro_matchup_advice(your_champion: str, enemy_champion: str) -> dict:
     Provides tips on laning, ability usage, and power spikes.
     """
     try:
-        # Initialize the LLM specifically for this tool
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0.3)
+        # The LLM for this tool is shared across calls
+        llm = _matchup_llm()
 
         # Create a detailed prompt for the LLM
         prompt_text = (
@@ -374,7 +678,8 @@ def analyze_gold_efficiency(match_id: str, game_name: str, tag_line: str) -> dic
     if not champion_name: return {"error": "Champion name not found in user match data."}
 
     # Find user by champion name (case-insensitive) and role
-    user_participant = next((p for p in user_match_data.get('allParticipants', []) if p['championName'].lower() == champion_name.lower() and p['teamPosition'] == 'UTILITY'), None)
+    target = champion_name.casefold()
+    user_participant = next((p for p in user_match_data.get('allParticipants', []) if p['championName'].casefold() == target and p['teamPosition'] == 'UTILITY'), None)
     if not user_participant: return {"error": "Could not find user's participant data."}
     
     enemy_support = next((p for p in user_match_data.get('allParticipants', []) if p['teamPosition'] == 'UTILITY' and p['teamId'] != user_participant['teamId']), None)
@@ -385,17 +690,12 @@ def analyze_gold_efficiency(match_id: str, game_name: str, tag_line: str) -> dic
     enemy_gpm = enemy_support.get("goldEarned", 0) / duration_minutes if enemy_support and duration_minutes > 0 else 0
 
     # --- FIX: Pro GPM calculation with case-insensitive champion matching from allParticipants ---
-    pro_data = load_json(PRO_DATA_FILE)
-    pro_gpms = []
-    for game in pro_data:
-        # Find the pro player's stats within the participants list
-        pro_participant = next((p for p in game.get('allParticipants', []) if p.get('championName', '').lower() == champion_name.lower()), None)
-        if pro_participant:
-            duration_minutes = game.get("gameDuration", 1) / 60
-            gpm = pro_participant.get("goldEarned", 0) / duration_minutes if duration_minutes > 0 else 0
-            pro_gpms.append(gpm)
-    
-    avg_pro_gpm = np.mean(pro_gpms) if pro_gpms else 0
+    # Pro GPMs are indexed by champion once per version of the pro file instead of scanning every game
+    try:
+        pro_gpms = _pro_gpms_by_champion_for_mtime(os.path.getmtime(PRO_DATA_FILE)).get(target)
+    except OSError:
+        pro_gpms = None
+    avg_pro_gpm = np.mean(pro_gpms) if pro_gpms is not None else 0
 
     # NOTE: Gold difference at 14 mins is disabled for now as timeline data is not stored.
     gold_diff_at_14 = "N/A"
@@ -6,57 +6,58 @@ Processes match data & timelines to produce JSON summaries on:
 - Roaming patterns and distance from lane
 """
 
-import os
-import json
 import math
+import bisect
+import functools
+import numpy as np
 import logging
 from typing import List, Dict, Any, Tuple, Optional
-from dotenv import load_dotenv
-
-# This loads the .env file from the current directory or parent directories
-load_dotenv()
-
-# Now, you can access the variables
-import os
-riot_key = os.getenv("RIOT_API_KEY")
-# Assumes riot_api.py is in the agent folder
 from src.api_client.riot_api import RiotAPIClient
+from src.utils.utils import write_json_array
 
 # --- Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Instantiate the client once to be reused across all functions
-try:
-    riot_client = RiotAPIClient()
-except ValueError as e:
-    logger.error(f"Failed to initialize RiotAPIClient: {e}")
-    # Exit or handle the case where the API key is missing
-    riot_client = None
+@functools.lru_cache(maxsize=1)
+def get_riot_client() -> Optional[RiotAPIClient]:
+    """
+    Returns the shared RiotAPIClient, created on first use so importing this
+    module doesn't need a RIOT_API_KEY. Returns None if the key is missing.
+    """
+    try:
+        # The client loads the project's .env itself
+        return RiotAPIClient()
+    except ValueError as e:
+        logger.error(f"Failed to initialize RiotAPIClient: {e}")
+        return None
 
 
 # ========== Data Fetching and Saving ==========
 
-def save_raw_match_details(match_ids: List[str], save_path: str = "data/raw_match_details.json") -> None:
+def save_raw_match_details(match_ids: List[str], region: str, save_path: str = "data/raw_match_details.json", pretty: bool = False) -> None:
     """
-    Downloads and saves the full, raw match detail JSON for a list of match IDs.
+    Downloads and saves the full, raw match detail JSON for a list of match IDs
+    from the given routing region (e.g. "europe").
+    The file is written compactly unless `pretty` is set for debugging.
     """
+    riot_client = get_riot_client()
     if not riot_client:
         logger.error("Riot API Client is not initialized. Cannot save match details.")
         return
 
-    all_matches_data = []
-    for mid in match_ids:
-        logger.info(f"Fetching match detail for {mid}")
-        match_data = riot_client.get_match_detail(mid)
-        if match_data:
-            all_matches_data.append(match_data)
-        else:
-            logger.warning(f"Failed to fetch details for match {mid}. Skipping.")
+    def _fetched_matches():
+        for mid in match_ids:
+            logger.info(f"Fetching match detail for {mid}")
+            match_data = riot_client.get_match_detail(mid, region)
+            if match_data:
+                yield match_data
+            else:
+                logger.warning(f"Failed to fetch details for match {mid}. Skipping.")
 
-    with open(save_path, "w", encoding='utf-8') as f:
-        json.dump(all_matches_data, f, indent=4)
-    logger.info(f"Saved raw details for {len(all_matches_data)} matches to {save_path}")
+    # Each match is written as soon as it's fetched instead of collecting them all first
+    match_count = write_json_array(save_path, _fetched_matches(), pretty=pretty)
+    logger.info(f"Saved raw details for {match_count} matches to {save_path}")
 
 
 # ========== Participant and Position Utilities ==========
@@ -71,6 +72,13 @@ def get_participant_info(timeline_data: Dict[str, Any], puuid: str) -> Tuple[Opt
             return p.get("participantId"), p.get("teamId")
     return None, None
 
+def index_participants(match_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns a {puuid: participant} lookup for a match, built once so callers
+    don't rescan the participant list for every lookup.
+    """
+    return {p.get("puuid"): p for p in match_data["info"]["participants"]}
+
 def calculate_distance(x1: int, y1: int, x2: int, y2: int) -> float:
     """
     Calculates the Euclidean distance between two points.
@@ -87,109 +95,126 @@ def extract_support_stats(match_data_list: list[dict[str, any]], puuid: str) ->
     """
     stats_list = []
     for match in match_data_list:
-        participant_info = next((p for p in match["info"]["participants"] if p.get("puuid") == puuid), None)
+        participant_info = index_participants(match).get(puuid)
         if not participant_info:
             continue
+        stats_list.append(_support_stats(match, participant_info))
+    return stats_list
 
-        challenges = participant_info.get("challenges", {})
-
-        # --- NEW: Create a simplified summary for all 10 players ---
-        all_participants_summary = []
-        for p in match["info"]["participants"]:
-            all_participants_summary.append({
-                "championName": p.get("championName"),
-                "teamPosition": p.get("teamPosition"),
-                "teamId": p.get("teamId"),
-                "win": p.get("win", False),
-                "kills": p.get("kills", 0),
-                "deaths": p.get("deaths", 0),
-                "assists": p.get("assists", 0),
-                "goldEarned": p.get("goldEarned", 0),
-                "puuid": p.get("puuid")
-            })
-
-        # --- Consolidate stats with multiple possible names ---
-        cc_time = (
-            participant_info.get("totalTimeCCingOthers") or
-            participant_info.get("timeCCingOthers") or
-            challenges.get("totalTimeCCDealt") or
-            0
-        )
-        # --- The definitive shield stat, using the new field you found ---
-        shielding = (
-            participant_info.get("totalDamageShieldedOnTeammates") or
-            participant_info.get("totalDamageShielded") or
-            challenges.get("effectiveHealAndShielding") or # Fallback
-            0
-        )
-        healing = (
-            participant_info.get("totalHealsOnTeammates") or
-            challenges.get("effectiveHealAndShielding") or # Fallback
-            0
-        )
-
-        stats = {
-            "matchId": match["metadata"]["matchId"],
-            "proPlayerName": participant_info.get("riotIdGameName") or participant_info.get("summonerName"),
-            "champion": participant_info.get("championName"),
-            "win": participant_info.get("win", False),
-            "gameDuration": match["info"].get("gameDuration", 0),
-            "allParticipants": all_participants_summary,
+def extract_support_match(match_data: dict[str, any], timeline_data: dict[str, any], participant_info: dict[str, any]) -> dict[str, any]:
+    """
+    Builds the full record for one support game: the match stats with the
+    timeline analysis merged straight into the same dict.
+    """
+    record = _support_stats(match_data, participant_info)
+    record.update(analyze_match_timeline(timeline_data, participant_info.get("participantId"), participant_info.get("teamId")))
+    return record
+
+def _support_stats(match_data: dict[str, any], participant_info: dict[str, any]) -> dict[str, any]:
+    """ Stats for one participant of one match; shared by the two extractors above. """
+    challenges = participant_info.get("challenges", {})
+
+    # --- NEW: Create a simplified summary for all 10 players ---
+    all_participants_summary = []
+    for p in match_data["info"]["participants"]:
+        all_participants_summary.append({
+            "championName": p.get("championName"),
+            "teamPosition": p.get("teamPosition"),
+            "teamId": p.get("teamId"),
+            "win": p.get("win", False),
+            "kills": p.get("kills", 0),
+            "deaths": p.get("deaths", 0),
+            "assists": p.get("assists", 0),
+            "goldEarned": p.get("goldEarned", 0),
+            "puuid": p.get("puuid")
+        })
+
+    # --- Consolidate stats with multiple possible names ---
+    cc_time = (
+        participant_info.get("totalTimeCCingOthers") or
+        participant_info.get("timeCCingOthers") or
+        challenges.get("totalTimeCCDealt") or
+        0
+    )
+    # --- The definitive shield stat, using the new field you found ---
+    shielding = (
+        participant_info.get("totalDamageShieldedOnTeammates") or
+        participant_info.get("totalDamageShielded") or
+        challenges.get("effectiveHealAndShielding") or # Fallback
+        0
+    )
+    healing = (
+        participant_info.get("totalHealsOnTeammates") or
+        challenges.get("effectiveHealAndShielding") or # Fallback
+        0
+    )
+
+    stats = {
+        "matchId": match_data["metadata"]["matchId"],
+        "proPlayerName": participant_info.get("riotIdGameName") or participant_info.get("summonerName"),
+        "champion": participant_info.get("championName"),
+        "win": participant_info.get("win", False),
+        "gameDuration": match_data["info"].get("gameDuration", 0),
+        "allParticipants": all_participants_summary,
             
-            # Core KDA
-            "kills": participant_info.get("kills", 0),
-            "deaths": participant_info.get("deaths", 0),
-            "assists": participant_info.get("assists", 0),
-            "killParticipation": challenges.get("killParticipation", 0.0),
-
-            # Items
-            "item0": participant_info.get("item0", 0),
-            "item1": participant_info.get("item1", 0),
-            "item2": participant_info.get("item2", 0),
-            "item3": participant_info.get("item3", 0),
-            "item4": participant_info.get("item4", 0),
-            "item5": participant_info.get("item5", 0),
-            "item6": participant_info.get("item6", 0), # Trinket
-
-            # Vision Stats
-            "visionScore": participant_info.get("visionScore", 0),
-            "wardsPlaced": participant_info.get("wardsPlaced", 0),
-            "wardsKilled": participant_info.get("wardsKilled", 0),
-            "detectorWardsPlaced": participant_info.get("detectorWardsPlaced", 0),
-            "visionWardsBoughtInGame": participant_info.get("visionWardsBoughtInGame", 0),
-            "visionScoreAdvantageLaneOpponent": challenges.get("visionScoreAdvantageLaneOpponent", 0.0),
-            "visionScorePerMinute": challenges.get("visionScorePerMinute", 0.0),
+        # Core KDA
+        "kills": participant_info.get("kills", 0),
+        "deaths": participant_info.get("deaths", 0),
+        "assists": participant_info.get("assists", 0),
+        "killParticipation": challenges.get("killParticipation", 0.0),
+
+        # Items
+        "item0": participant_info.get("item0", 0),
+        "item1": participant_info.get("item1", 0),
+        "item2": participant_info.get("item2", 0),
+        "item3": participant_info.get("item3", 0),
+        "item4": participant_info.get("item4", 0),
+        "item5": participant_info.get("item5", 0),
+        "item6": participant_info.get("item6", 0), # Trinket
+
+        # Vision Stats
+        "visionScore": participant_info.get("visionScore", 0),
+        "wardsPlaced": participant_info.get("wardsPlaced", 0),
+        "wardsKilled": participant_info.get("wardsKilled", 0),
+        "detectorWardsPlaced": participant_info.get("detectorWardsPlaced", 0),
+        "visionWardsBoughtInGame": participant_info.get("visionWardsBoughtInGame", 0),
+        "visionScoreAdvantageLaneOpponent": challenges.get("visionScoreAdvantageLaneOpponent", 0.0),
+        "visionScorePerMinute": challenges.get("visionScorePerMinute", 0.0),
             
-            # Combat and Utility Stats
-            "totalTimeCCingOthers": cc_time,
-            "totalHealsOnTeammates": healing,
-            "totalDamageShieldedOnTeammates": shielding,
-            "enemyChampionImmobilizations": challenges.get("enemyChampionImmobilizations", 0),
-            "saveAllyFromDeath": challenges.get("saveAllyFromDeath", 0),
-            "skillshotsHit": challenges.get("skillshotsHit", 0),
-            "damageTakenOnTeamPercentage": challenges.get("damageTakenOnTeamPercentage", 0.0),
-
-            # Pings
-            "assistMePings": participant_info.get("assistMePings", 0),
-            "enemyMissingPings": participant_info.get("enemyMissingPings", 0),
-            "enemyVisionPings": participant_info.get("enemyVisionPings", 0),
-            "onMyWayPings": participant_info.get("onMyWayPings", 0),
-            "visionClearedPings": participant_info.get("visionClearedPings", 0),
+        # Combat and Utility Stats
+        "totalTimeCCingOthers": cc_time,
+        "totalHealsOnTeammates": healing,
+        "totalDamageShieldedOnTeammates": shielding,
+        "enemyChampionImmobilizations": challenges.get("enemyChampionImmobilizations", 0),
+        "saveAllyFromDeath": challenges.get("saveAllyFromDeath", 0),
+        "skillshotsHit": challenges.get("skillshotsHit", 0),
+        "damageTakenOnTeamPercentage": challenges.get("damageTakenOnTeamPercentage", 0.0),
+
+        # Pings
+        "assistMePings": participant_info.get("assistMePings", 0),
+        "enemyMissingPings": participant_info.get("enemyMissingPings", 0),
+        "enemyVisionPings": participant_info.get("enemyVisionPings", 0),
+        "onMyWayPings": participant_info.get("onMyWayPings", 0),
+        "visionClearedPings": participant_info.get("visionClearedPings", 0),
             
-            # More Challenge Stats
-            "controlWardTimeCoverageInRiverOrEnemyHalf": challenges.get("controlWardTimeCoverageInRiverOrEnemyHalf", 0.0),
-            "highestCrowdControlScore": challenges.get("highestCrowdControlScore", 0),
-            "controlWardsPlaced": challenges.get("controlWardsPlaced", 0),
-            "effectiveHealAndShielding": challenges.get("effectiveHealAndShielding", 0.0),
-            "immobilizeAndKillWithAlly": challenges.get("immobilizeAndKillWithAlly", 0),
-            "knockEnemyIntoTeamAndKill": challenges.get("knockEnemyIntoTeamAndKill", 0),
-            "stealthWardsPlaced": challenges.get("stealthWardsPlaced", 0),
-            "wardsGuarded": challenges.get("wardsGuarded", 0),
-            "wardTakedowns": challenges.get("wardTakedowns", 0),
-            "wardTakedownsBefore20M": challenges.get("wardTakedownsBefore20M", 0),
-        }
-        stats_list.append(stats)
-    return stats_list
+        # More Challenge Stats
+        "controlWardTimeCoverageInRiverOrEnemyHalf": challenges.get("controlWardTimeCoverageInRiverOrEnemyHalf", 0.0),
+        "highestCrowdControlScore": challenges.get("highestCrowdControlScore", 0),
+        "controlWardsPlaced": challenges.get("controlWardsPlaced", 0),
+        "effectiveHealAndShielding": challenges.get("effectiveHealAndShielding", 0.0),
+        "immobilizeAndKillWithAlly": challenges.get("immobilizeAndKillWithAlly", 0),
+        "knockEnemyIntoTeamAndKill": challenges.get("knockEnemyIntoTeamAndKill", 0),
+        "stealthWardsPlaced": challenges.get("stealthWardsPlaced", 0),
+        "wardsGuarded": challenges.get("wardsGuarded", 0),
+        "wardTakedowns": challenges.get("wardTakedowns", 0),
+        "wardTakedownsBefore20M": challenges.get("wardTakedownsBefore20M", 0),
+    }
+    return stats
+
+
+# Event types the timeline loop tests membership against, built once
+ITEM_EVENT_TYPES = frozenset({"ITEM_PURCHASED", "ITEM_SOLD", "ITEM_UNDO"})
+OBJECTIVE_EVENT_TYPES = frozenset({"ELITE_MONSTER_KILL", "BUILDING_KILL"})
 
 
 def analyze_match_timeline(timeline_data: dict[str, any], participant_id: int, team_id: int) -> dict[str, any]:
@@ -198,7 +223,8 @@ def analyze_match_timeline(timeline_data: dict[str, any], participant_id: int, t
     skill leveling, vision events, combat events, and item purchases.
     """
     # --- Initialize all data lists ---
-    early_game_pathing, full_game_pathing, death_positions, enemy_objective_takes = [], [], [], []
+    full_game_pathing, death_positions, enemy_objective_takes = [], [], []
+    early_game_cutoff_idx = 0
     skill_level_order = []
     vision_events = []
     item_events = []
@@ -215,43 +241,57 @@ def analyze_match_timeline(timeline_data: dict[str, any], participant_id: int, t
 
     if not timeline_data or "frames" not in timeline_data.get("info", {}):
         return {
-            "early_game_pathing": [], "full_game_pathing": [], "death_positions": [],
+            "early_game_cutoff_idx": 0, "full_game_pathing": [], "death_positions": [],
             "enemy_objective_takes": [], "skill_level_order": [], "vision_events": [],
             "item_events": [], "combat_events": [], "ally_objective_takes": []
         }
 
-    # --- Frame and Event Processing Loop ---
-    for frame in timeline_data["info"]["frames"]:
-        timestamp = frame.get("timestamp", 0)
-        
-        # Pathing Analysis
-        participant_frame = frame.get("participantFrames", {}).get(str(participant_id))
+    frames = timeline_data["info"]["frames"]
+
+    # --- Pathing Analysis ---
+    # Positions are gathered first so every distance from the tower is computed in one NumPy pass
+    participant_key = str(participant_id)
+    path_timestamps, path_positions = [], []
+    for frame in frames:
+        participant_frame = frame.get("participantFrames", {}).get(participant_key)
         if participant_frame and "position" in participant_frame:
-            pos = participant_frame["position"]
-            distance = calculate_distance(pos["x"], pos["y"], bot_tower_pos[0], bot_tower_pos[1])
-            pathing_point = {"timestamp": timestamp, "position": pos, "distance_from_tower": round(distance)}
-            full_game_pathing.append(pathing_point)
-            if timestamp <= twenty_minutes_ms:
-                early_game_pathing.append(pathing_point)
+            path_timestamps.append(frame.get("timestamp", 0))
+            path_positions.append(participant_frame["position"])
+    if path_positions:
+        offsets = np.array([(pos["x"], pos["y"]) for pos in path_positions], dtype=np.float64) - bot_tower_pos
+        # Same sqrt-of-squares and half-to-even rounding as calculate_distance + round()
+        distances = np.rint(np.sqrt((offsets ** 2).sum(axis=1))).astype(np.int64).tolist()
+        full_game_pathing = [{"timestamp": ts, "position": pos, "distance_from_tower": dist}
+                             for ts, pos, dist in zip(path_timestamps, path_positions, distances)]
+        # The early game is stored as a boundary into full_game_pathing rather than a second copy of it.
+        # Frames are chronological, so full_game_pathing[:early_game_cutoff_idx] is the first 20 minutes.
+        early_game_cutoff_idx = bisect.bisect_right(path_timestamps, twenty_minutes_ms)
+
+    # --- Event Processing Loop ---
+    for frame in frames:
+        timestamp = frame.get("timestamp", 0)
 
         # Event Analysis
-        for event in frame.get("events", []):
+        # Each event has exactly one type, so dispatch on it once and check the player inside the branch
+        for event in frame.get("events", ()):
             event_type = event.get("type")
             
             # --- Capture events related to our player ---
-            if event.get("participantId") == participant_id:
-                if event_type == "SKILL_LEVEL_UP":
+            if event_type == "SKILL_LEVEL_UP":
+                if event.get("participantId") == participant_id:
                     skill_level_order.append(event.get("skillSlot"))
-                elif event_type in ["ITEM_PURCHASED", "ITEM_SOLD", "ITEM_UNDO"]:
+            elif event_type in ITEM_EVENT_TYPES:
+                if event.get("participantId") == participant_id:
                     item_events.append({"timestamp": timestamp, "type": event_type, "itemId": event.get("itemId")})
 
             # --- Capture Vision and Combat Events by player ---
-            if event_type == "WARD_PLACED" and event.get("creatorId") == participant_id:
-                vision_events.append({"timestamp": timestamp, "type": "PLACED", "ward_type": event.get("wardType"), "position": event.get("position", {})})
-            elif event_type == "WARD_KILLED" and event.get("killerId") == participant_id:
-                vision_events.append({"timestamp": timestamp, "type": "KILLED", "ward_type": event.get("wardType"), "position": event.get("position", {})})
-            
-            if event_type == "CHAMPION_KILL":
+            elif event_type == "WARD_PLACED":
+                if event.get("creatorId") == participant_id:
+                    vision_events.append({"timestamp": timestamp, "type": "PLACED", "ward_type": event.get("wardType"), "position": event.get("position", {})})
+            elif event_type == "WARD_KILLED":
+                if event.get("killerId") == participant_id:
+                    vision_events.append({"timestamp": timestamp, "type": "KILLED", "ward_type": event.get("wardType"), "position": event.get("position", {})})
+            elif event_type == "CHAMPION_KILL":
                 if event.get("victimId") == participant_id:
                     death_positions.append(event)
                 elif event.get("killerId") == participant_id:
@@ -260,8 +300,9 @@ def analyze_match_timeline(timeline_data: dict[str, any], participant_id: int, t
                     combat_events.append({"timestamp": timestamp, "type": "ASSIST", "position": event.get("position", {})})
 
             # --- Capture Objective Takes by either team ---
-            killer_team = event.get("killerTeamId", event.get("teamId"))
-            if event_type in ["ELITE_MONSTER_KILL", "BUILDING_KILL"]:
+            elif event_type in OBJECTIVE_EVENT_TYPES:
+                # Only objective events need the killing team, so it isn't looked up for every event
+                killer_team = event.get("killerTeamId", event.get("teamId"))
                 obj_data = {"timestamp": timestamp, "type": event.get("monsterType") or event.get("buildingType"), "lane": event.get("laneType"), "position": event.get("position", {})}
                 if killer_team == enemy_team_id:
                     enemy_objective_takes.append(obj_data)
@@ -269,7 +310,7 @@ def analyze_match_timeline(timeline_data: dict[str, any], participant_id: int, t
                     ally_objective_takes.append(obj_data)
 
     return {
-        "early_game_pathing": early_game_pathing,
+        "early_game_cutoff_idx": early_game_cutoff_idx,
         "full_game_pathing": full_game_pathing,
         "death_positions": death_positions,
         "enemy_objective_takes": enemy_objective_takes,
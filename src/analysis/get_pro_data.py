@@ -1,27 +1,28 @@
 import os
-import json
+import orjson
 import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import List, Dict, Any
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.api_client.riot_api import RiotAPIClient
-from src.analysis.analysis import extract_support_stats, analyze_match_timeline
+from src.api_client.riot_api import AsyncRiotAPIClient
+from src.analysis.analysis import extract_support_match, index_participants, get_riot_client
 from src.utils.utils import load_json
 
 # --- Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-try:
-    riot_client = RiotAPIClient()
-except ValueError as e:
-    logger.error(f"Failed to initialize RiotAPIClient: {e}")
-    riot_client = None
-
 # --- File Paths ---
 PRO_PLAYER_CONFIG_PATH = "data/pro_players.json"
 PRO_DATA_DIR = "data/pro_players/"
 MERGED_PRO_DATA_PATH = "data/pro_players_merged.json"
+# Byte range and source mtime of each player's matches in the merged file, for incremental merges
+MERGED_PRO_MANIFEST_PATH = "data/pro_players_merged.manifest.json"
+# Kept outside PRO_DATA_DIR so merge_pro_data doesn't pick the sidecars up
+PRO_SEEN_DIR = "data/pro_players_seen/"
 MATCH_COUNT_TO_FETCH = 15
 
 
@@ -31,6 +32,7 @@ def enrich_pro_player_config_with_puuids() -> List[Dict[str, Any]]:
     and saves the updated config back to the file. This should only need
     to fetch the PUUID for each player once.
     """
+    riot_client = get_riot_client()
     if not riot_client:
         logger.error("Riot API Client not initialized. Cannot enrich config.")
         return []
@@ -57,17 +59,30 @@ def enrich_pro_player_config_with_puuids() -> List[Dict[str, Any]]:
                 logger.error(f"Could not fetch PUUID for {player['gameName']}. Please check their Riot ID and region.")
 
     if config_was_updated:
-        with open(PRO_PLAYER_CONFIG_PATH, 'w', encoding='utf-8') as f:
-            json.dump(players, f, indent=2)
+        with open(PRO_PLAYER_CONFIG_PATH, 'wb') as f:
+            f.write(orjson.dumps(players, option=orjson.OPT_INDENT_2))
         logger.info(f"Updated {PRO_PLAYER_CONFIG_PATH} with new PUUIDs.")
     
     return players
 
 
+def _get_non_support_filepath(player_name: str) -> str:
+    """ Sidecar file listing the player's match IDs already known not to be support games. """
+    return os.path.join(PRO_SEEN_DIR, f"{player_name}.json")
+
+
 def update_pro_player_data(player_info: dict[str, any]):
     """
     Fetches and processes both stats and timeline data for new support games.
     """
+    asyncio.run(_update_pro_players_async([player_info]))
+
+
+async def update_pro_player_data_async(riot_client: AsyncRiotAPIClient, player_info: dict[str, any]):
+    """
+    Async version of update_pro_player_data. The new matches' details, then the
+    support games' timelines, are requested concurrently on `riot_client`.
+    """
     player_name = player_info['gameName']
     player_puuid = player_info['puuid']
     player_region = player_info['region']
@@ -79,82 +94,162 @@ def update_pro_player_data(player_info: dict[str, any]):
     existing_match_ids = {match['matchId'] for match in player_data}
     os.makedirs(PRO_DATA_DIR, exist_ok=True)
 
-    recent_match_ids = riot_client.get_match_ids_by_puuid(player_puuid, player_region, count=35)
+    recent_match_ids = await riot_client.get_match_ids_by_puuid(player_puuid, player_region, count=35)
     if not recent_match_ids:
         logger.warning(f"No recent matches found for {player_name}.")
         return
 
-    new_match_ids = [mid for mid in recent_match_ids if mid not in existing_match_ids]
+    # Skip games a previous run already classified as non-support
+    non_support_path = _get_non_support_filepath(player_name)
+    known_non_support = set(load_json(non_support_path)) if os.path.exists(non_support_path) else set()
+    new_match_ids = [mid for mid in recent_match_ids if mid not in existing_match_ids and mid not in known_non_support]
     if not new_match_ids:
         logger.info(f"No new matches to check for {player_name}.")
         return
 
     logger.info(f"Checking {len(new_match_ids)} new matches for support role...")
-    
-    new_matches_to_add = []
-    for mid in new_match_ids:
-        match_detail = riot_client.get_match_detail(mid, region=player_region)
+    match_details = await asyncio.gather(*(riot_client.get_match_detail(mid, region=player_region) for mid in new_match_ids))
+
+    support_matches = []
+    new_non_support = []
+    for mid, match_detail in zip(new_match_ids, match_details):
         if not match_detail:
             continue
         
-        participant_info = next((p for p in match_detail["info"]["participants"] if p.get("puuid") == player_puuid), None)
+        participant_info = index_participants(match_detail).get(player_puuid)
         
         if participant_info and participant_info.get("teamPosition") == "UTILITY":
-            logger.info(f"Found support game {mid}. Fetching timeline...")
-            timeline_data = riot_client.get_match_timeline(mid, region=player_region)
-            if not timeline_data:
-                logger.warning(f"Could not fetch timeline for {mid}. Skipping timeline analysis.")
-                continue
-
-            # Get stats and timeline analysis for this single match
-            stats = extract_support_stats([match_detail], player_puuid)[0] # Pass as a list to reuse function
-            
-            p_id = participant_info.get("participantId")
-            team_id = participant_info.get("teamId")
-            timeline_analysis = analyze_match_timeline(timeline_data, p_id, team_id)
-
-            # Merge all data together for this one match
-            combined_match_data = {**stats, **timeline_analysis}
-            new_matches_to_add.append(combined_match_data)
+            logger.info(f"Found support game {mid}.")
+            support_matches.append((mid, match_detail, participant_info))
+        else:
+            new_non_support.append(mid)
+
+    if new_non_support:
+        os.makedirs(PRO_SEEN_DIR, exist_ok=True)
+        with open(non_support_path, 'wb') as f:
+            f.write(orjson.dumps(sorted(known_non_support.union(new_non_support))))
+
+    logger.info(f"Fetching timelines for {len(support_matches)} support games...")
+    timelines = await asyncio.gather(*(riot_client.get_match_timeline(mid, region=player_region) for mid, _, _ in support_matches))
+
+    new_matches_to_add = []
+    for (mid, match_detail, participant_info), timeline_data in zip(support_matches, timelines):
+        if not timeline_data:
+            logger.warning(f"Could not fetch timeline for {mid}. Skipping timeline analysis.")
+            continue
+
+        # Stats and timeline analysis for this single match, built as one record
+        new_matches_to_add.append(extract_support_match(match_detail, timeline_data, participant_info))
 
     if new_matches_to_add:
         player_data.extend(new_matches_to_add)
-        with open(player_file_path, 'w', encoding='utf-8') as f:
-            json.dump(player_data, f, indent=4)
+        with open(player_file_path, 'wb') as f:
+            f.write(orjson.dumps(player_data, option=orjson.OPT_INDENT_2))
         logger.info(f"Successfully saved {len(new_matches_to_add)} new support matches with timeline data to {player_file_path}.")
     else:
         logger.info(f"No new support games found for {player_name} in the latest batch.")
 
 
+async def _update_pro_players_async(pro_players: List[Dict[str, Any]]):
+    """Updates the players one after another over a single async Riot client."""
+    try:
+        riot_client = AsyncRiotAPIClient()
+    except ValueError as e:
+        logger.error(f"Failed to initialize AsyncRiotAPIClient: {e}")
+        return
+
+    async with riot_client:
+        for player_info in pro_players:
+            if "puuid" in player_info and player_info["puuid"]:
+                await update_pro_player_data_async(riot_client, player_info)
+            else:
+                logger.warning(f"Skipping {player_info['gameName']} because PUUID is missing.")
+
+
 def update_all_pro_players(pro_players: List[Dict[str, Any]]):
     """Loops through all players and updates their data."""
-    for player_info in pro_players:
-        if "puuid" in player_info and player_info["puuid"]:
-            update_pro_player_data(player_info)
-        else:
-            logger.warning(f"Skipping {player_info['gameName']} because PUUID is missing.")
+    asyncio.run(_update_pro_players_async(pro_players))
+
+
+def _load_merge_manifest() -> Dict[str, Any]:
+    """
+    Returns the per-player entries of the last merge's manifest, or {} if the
+    merged file has changed since (e.g. a git checkout) and can't be reused.
+    """
+    if not (os.path.exists(MERGED_PRO_MANIFEST_PATH) and os.path.exists(MERGED_PRO_DATA_PATH)):
+        return {}
+    manifest = load_json(MERGED_PRO_MANIFEST_PATH)
+    merged_stat = os.stat(MERGED_PRO_DATA_PATH)
+    if not isinstance(manifest, dict) or manifest.get("merged") != [merged_stat.st_mtime_ns, merged_stat.st_size]:
+        return {}
+    return manifest.get("players", {})
 
 
 def merge_pro_data():
-    """Merges all individual pro player JSON files into a single file."""
-    all_pro_stats = []
+    """
+    Merges all individual pro player JSON files into a single file.
+    Players whose file hasn't changed since the last merge are copied over from
+    the previous merged file as raw bytes instead of being parsed again.
+    """
     if not os.path.exists(PRO_DATA_DIR):
         logger.warning(f"Pro player data directory not found: {PRO_DATA_DIR}")
         return
 
-    for filename in os.listdir(PRO_DATA_DIR):
-        if filename.endswith(".json"):
-            player_name = filename.replace(".json", "")
-            logger.info(f"Merging data for {player_name}")
-            file_path = os.path.join(PRO_DATA_DIR, filename)
-            player_data = load_json(file_path)
-            for match in player_data:
-                match['proPlayerName'] = player_name
-            all_pro_stats.extend(player_data)
-
-    with open(MERGED_PRO_DATA_PATH, 'w', encoding='utf-8') as f:
-        json.dump(all_pro_stats, f, indent=4)
-    logger.info(f"Successfully merged data for {len(all_pro_stats)} matches into {MERGED_PRO_DATA_PATH}.")
+    with os.scandir(PRO_DATA_DIR) as entries:
+        player_files = [(entry.name.replace(".json", ""), entry.path, entry.stat().st_mtime_ns)
+                        for entry in entries if entry.name.endswith(".json")]
+
+    previous = _load_merge_manifest()
+    reusable = {name for name, _, mtime_ns in player_files if previous.get(name, {}).get("mtime_ns") == mtime_ns}
+    if len(reusable) == len(player_files) == len(previous):
+        logger.info(f"No pro player files changed since the last merge; {MERGED_PRO_DATA_PATH} is up to date.")
+        return
+
+    # Same layout as write_json_array, so reused byte ranges splice in exactly
+    tmp_path = MERGED_PRO_DATA_PATH + ".tmp"
+    players_manifest = {}
+    match_count = 0
+    stale_paths = iter([path for name, path, _ in player_files if name not in reusable])
+    with open(tmp_path, 'wb') as out, \
+            (open(MERGED_PRO_DATA_PATH, 'rb') if reusable else nullcontext()) as old_merged, \
+            ThreadPoolExecutor(max_workers=1) as executor:
+        def _load_next_stale():
+            # The next changed player's file is read in the background while the current one is written
+            path = next(stale_paths, None)
+            return executor.submit(load_json, path) if path else None
+
+        next_load = _load_next_stale()
+        out.write(b"[")
+        for player_name, _, mtime_ns in player_files:
+            if player_name in reusable:
+                entry = previous[player_name]
+                old_merged.seek(entry["start"])
+                chunk = old_merged.read(entry["end"] - entry["start"])
+                player_count = entry["count"]
+            else:
+                player_data = next_load.result()
+                next_load = _load_next_stale()
+                logger.info(f"Merging data for {player_name}")
+                for match in player_data:
+                    match['proPlayerName'] = player_name
+                chunk = b",\n  ".join(orjson.dumps(match, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  ")
+                                      for match in player_data)
+                player_count = len(player_data)
+
+            if player_count:
+                out.write(b",\n  " if match_count else b"\n  ")
+            start = out.tell()
+            out.write(chunk)
+            players_manifest[player_name] = {"mtime_ns": mtime_ns, "start": start, "end": out.tell(), "count": player_count}
+            match_count += player_count
+        out.write(b"\n]" if match_count else b"]")
+
+    os.replace(tmp_path, MERGED_PRO_DATA_PATH)
+    merged_stat = os.stat(MERGED_PRO_DATA_PATH)
+    with open(MERGED_PRO_MANIFEST_PATH, 'wb') as f:
+        f.write(orjson.dumps({"merged": [merged_stat.st_mtime_ns, merged_stat.st_size], "players": players_manifest}))
+    logger.info(f"Successfully merged data for {match_count} matches into {MERGED_PRO_DATA_PATH} "
+                f"({len(reusable)} unchanged players reused).")
 
 
 if __name__ == '__main__':
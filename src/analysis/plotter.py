@@ -2,9 +2,13 @@ import matplotlib
 matplotlib.use('Agg') # <-- ADD THIS LINE
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
+from matplotlib.figure import Figure
 import numpy as np
 import os
-from matplotlib.animation import FuncAnimation
+import functools
+import imageio.v2 as imageio
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from src.utils.utils import load_json
 
 # Define paths
@@ -12,10 +16,95 @@ ASSETS_DIR = "assets"
 OUTPUT_DIR = "data/plots"
 MAP_IMAGE_PATH = os.path.join(ASSETS_DIR, "summoners_rift_map.webp")
 
+# Saved maps are embedded in the chat / Streamlit page, so ~1000px is plenty
+STATIC_MAP_DPI = 120
+# optimize=True would override compress_level with Pillow's slowest search for ~2% smaller files
+PNG_SAVE_KWARGS = {'compress_level': 6}
+
 # Ensure the output directory for plots exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
+@functools.lru_cache(maxsize=1)
+def _load_map() -> np.ndarray | None:
+    """
+    Decodes the Summoner's Rift map once per process and shares it between plots.
+    Returns None if the image is missing. The array is read-only since it is shared.
+    """
+    try:
+        img = mpimg.imread(MAP_IMAGE_PATH)
+    except FileNotFoundError:
+        return None
+    img.setflags(write=False)
+    return img
+
+
+# (plot, matchId, champion) -> (path, mtime) of the image saved for it
+_saved_plots = {}
+
+def _reuse_saved_plot(plot_fn):
+    """
+    A finished match always renders to the same image, so a repeat request for the
+    same match and champion returns the PNG already on disk instead of drawing and
+    encoding it again. The file's mtime must be unchanged, since another player in
+    the same match writes to the same filename.
+    """
+    @functools.wraps(plot_fn)
+    def wrapper(match_data: dict) -> str | None:
+        match_id = match_data.get("matchId")
+        key = (plot_fn.__name__, match_id, match_data.get("champion"))
+        saved = _saved_plots.get(key)
+        if match_id and saved:
+            path, mtime = saved
+            try:
+                if os.path.getmtime(path) == mtime:
+                    return path
+            except OSError:
+                pass
+        output_path = plot_fn(match_data)
+        if match_id and output_path:
+            _saved_plots[key] = (output_path, os.path.getmtime(output_path))
+        return output_path
+    return wrapper
+
+
+def _dark_map_axes(fig: Figure):
+    """
+    Black figure and axes with white spines, the look of the 'dark_background' style,
+    but applied to this figure only. plt.style.use would change the global rcParams,
+    which races with other renders when a map is drawn from a worker thread.
+    """
+    fig.set_facecolor('black')
+    ax = fig.subplots()
+    ax.set_facecolor('black')
+    for spine in ax.spines.values():
+        spine.set_edgecolor('white')
+    return ax
+
+
+def _positions_to_xy(events: list[dict], key: str = 'position') -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extracts the x and y coordinates of a list of events in a single pass.
+    Returns two contiguous float32 arrays, skipping events without a position.
+    """
+    coords = [(e[key]['x'], e[key]['y']) for e in events if key in e and 'x' in e[key] and 'y' in e[key]]
+    if not coords:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+    x, y = np.asarray(coords, dtype=np.float32).T.copy()
+    return x, y
+
+
+def _pathing_to_arrays(pathing_data: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converts pathing points into parallel arrays in a single pass:
+    int64 timestamps and an (N, 2) float32 array of x/y positions.
+    """
+    rows = [(p['timestamp'], p['position']['x'], p['position']['y']) for p in pathing_data]
+    ts = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    xy = np.array([r[1:] for r in rows], dtype=np.float32).reshape(-1, 2)
+    return ts, xy
+
+
 def plot_metric(user_data: list[dict], pro_data: list[dict], metric: str, user_label: str = "Your Stats"):
     """
     Creates a bar chart and returns the Matplotlib figure object.
@@ -59,9 +148,8 @@ def plot_death_locations(all_matches_data: list[dict]):
         print("No death location data found to plot.")
         return None
 
-    try:
-        img = mpimg.imread(MAP_IMAGE_PATH)
-    except FileNotFoundError:
+    img = _load_map()
+    if img is None:
         print(f"Error: Map image not found at {MAP_IMAGE_PATH}")
         return None
 
@@ -69,8 +157,7 @@ def plot_death_locations(all_matches_data: list[dict]):
     fig, ax = plt.subplots(figsize=(10, 10))
     ax.imshow(img, extent=[0, 15000, 0, 15000])
 
-    x_coords = [death['position']['x'] for death in all_deaths if 'position' in death and 'x' in death['position']]
-    y_coords = [death['position']['y'] for death in all_deaths if 'position' in death and 'y' in death['position']]
+    x_coords, y_coords = _positions_to_xy(all_deaths)
 
     ax.scatter(x_coords, y_coords, color='red', s=100, alpha=0.5, edgecolors='white', linewidth=0.5)
     ax.set_title("Player Death Locations")
@@ -82,63 +169,100 @@ def plot_death_locations(all_matches_data: list[dict]):
     return fig # <-- Return the figure object
 
 
-def create_game_animation(match_data: dict, output_filename: str = "path_animation.gif"):
+def _render_animation_frames(frame_indices: list[int], x_path: np.ndarray, y_path: np.ndarray, timestamps: np.ndarray,
+                             death_ts: np.ndarray, death_xy: np.ndarray, title: str) -> list[np.ndarray]:
     """
-    (Upgraded) Creates a slower, smoother GIF animation of a single game.
+    Renders a contiguous chunk of animation frames on its own figure and returns
+    them as RGB arrays. Lives at module level so it can run in a worker process.
     """
-    pathing_data = match_data.get("full_game_pathing")
-    death_positions = match_data.get("death_positions", [])
-
-    if not pathing_data:
-        print(f"Error: No 'full_game_pathing' data for animation.")
-        return None
-
     plt.style.use('dark_background')
     fig, ax = plt.subplots(figsize=(10, 10))
-    # ... (the rest of the setup code is the same) ...
     plt.xticks([])
     plt.yticks([])
-    try:
-        img = mpimg.imread(MAP_IMAGE_PATH)
+    img = _load_map()
+    if img is not None:
         ax.imshow(img, extent=[0, 15000, 0, 15000])
-    except FileNotFoundError:
+    else:
         print(f"Warning: Map image not found at {MAP_IMAGE_PATH}")
-    ax.set_title(f"Game Animation: {match_data.get('champion', 'N/A')} ({match_data.get('matchId')})")
-    path_line, = ax.plot([], [], '-', color='cyan', linewidth=2)
-    player_dot, = ax.plot([], [], 'o', color='white', markersize=10)
-    death_plot, = ax.plot([], [], 'X', color='red', markersize=15, linestyle='None', markeredgecolor='white')
-    x_path = [p['position']['x'] for p in pathing_data]
-    y_path = [p['position']['y'] for p in pathing_data]
-
-    def update(frame):
+    ax.set_title(title)
+    # The moving artists are animated, so the full draw below only renders the static background
+    path_line, = ax.plot([], [], '-', color='cyan', linewidth=2, animated=True)
+    player_dot, = ax.plot([], [], 'o', color='white', markersize=10, animated=True)
+    death_plot, = ax.plot([], [], 'X', color='red', markersize=15, linestyle='None', markeredgecolor='white', animated=True)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+
+    rendered = []
+    for frame in frame_indices:
         path_line.set_data(x_path[:frame+1], y_path[:frame+1])
         player_dot.set_data([x_path[frame]], [y_path[frame]])
-        current_timestamp = pathing_data[frame]['timestamp']
-        past_deaths = [d['position'] for d in death_positions if d.get('timestamp', 0) <= current_timestamp]
-        if past_deaths:
-            death_x = [pos['x'] for pos in past_deaths]
-            death_y = [pos['y'] for pos in past_deaths]
-            death_plot.set_data(death_x, death_y)
-        return path_line, player_dot, death_plot
-
-    num_frames = len(pathing_data)
-    
-    # --- NEW: Slower animation settings ---
-    # We now step by 2 frames (smoother) and have a longer delay (slower).
-    ani = FuncAnimation(fig, update, frames=range(0, num_frames, 2), blit=False, interval=150, repeat=False)
+        # Deaths are sorted by time, so the ones already seen form a prefix
+        num_deaths = np.searchsorted(death_ts, timestamps[frame], side='right')
+        if num_deaths:
+            death_plot.set_data(death_xy[:num_deaths, 0], death_xy[:num_deaths, 1])
+        # Blit: paste the cached map back and redraw only the three moving artists
+        fig.canvas.restore_region(background)
+        for artist in (path_line, player_dot, death_plot):
+            ax.draw_artist(artist)
+        # The canvas buffer is reused on the next draw, so keep our own copy.
+        rendered.append(np.asarray(fig.canvas.buffer_rgba())[:, :, :3].copy())
+
+    plt.close(fig)
+    return rendered
+
+
+def create_game_animation(match_data: dict, output_filename: str = "path_animation.gif", frame_step: int = None):
+    """
+    (Upgraded) Creates a slower, smoother GIF animation of a single game.
+    Frames are rendered in parallel worker processes, then stitched with imageio.
+    `frame_step` is the number of pathing points per frame; by default every 2nd point
+    is drawn, and very long games are strided harder so they stay around 300 frames.
+    """
+    pathing_data = match_data.get("full_game_pathing")
+    death_positions = match_data.get("death_positions", [])
+
+    if not pathing_data:
+        print(f"Error: No 'full_game_pathing' data for animation.")
+        return None
+
+    title = f"Game Animation: {match_data.get('champion', 'N/A')} ({match_data.get('matchId')})"
+    x_path, y_path = _positions_to_xy(pathing_data)
+    timestamps = np.fromiter((p['timestamp'] for p in pathing_data), dtype=np.int64, count=len(pathing_data))
+    deaths_sorted = sorted((d for d in death_positions if 'position' in d), key=lambda d: d.get('timestamp', 0))
+    death_ts = np.array([d.get('timestamp', 0) for d in deaths_sorted], dtype=np.int64)
+    death_xy = np.array([(d['position']['x'], d['position']['y']) for d in deaths_sorted], dtype=np.float32).reshape(-1, 2)
+
+    # We step by at least 2 frames (smoother) and hold each frame for 150ms (slower).
+    if frame_step is None:
+        frame_step = max(2, len(pathing_data) // 300)
+    frame_indices = list(range(0, len(pathing_data), frame_step))
+
+    # --- Split the frames into one contiguous chunk per worker ---
+    # Each worker sets up a single figure for its chunk instead of one per frame.
+    num_workers = min(len(frame_indices), os.cpu_count() or 1)
+    chunks = [chunk.tolist() for chunk in np.array_split(frame_indices, num_workers)]
 
     output_path = os.path.join(OUTPUT_DIR, output_filename)
     print(f"Saving animation to {output_path}. This may take a while...")
     try:
-        ani.save(output_path, writer='pillow', dpi=100)
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            rendered_chunks = executor.map(
+                _render_animation_frames, chunks,
+                repeat(x_path), repeat(y_path), repeat(timestamps), repeat(death_ts), repeat(death_xy), repeat(title)
+            )
+            # Frames are read straight from the Agg canvas buffer and streamed to imageio,
+            # which avoids the per-frame PNG round-trip of FuncAnimation's pillow writer.
+            with imageio.get_writer(output_path, mode='I', duration=150, loop=0) as writer:
+                for rendered in rendered_chunks:
+                    for frame_rgb in rendered:
+                        writer.append_data(frame_rgb)
         print(f"Successfully saved {output_filename}")
-        plt.close(fig)
         return output_path
     except Exception as e:
         print(f"\nError saving animation: {e}")
-        plt.close(fig)
         return None
     
+@_reuse_saved_plot
 def plot_combat_heatmap(match_data: dict) -> str | None:
     """
     Generates a map showing Kills/Assists (blue) vs. Deaths (red) for a single game.
@@ -151,41 +275,46 @@ def plot_combat_heatmap(match_data: dict) -> str | None:
         print(f"No combat or death data to plot for match {match_id}.")
         return None
 
-    try:
-        img = mpimg.imread(MAP_IMAGE_PATH)
-    except FileNotFoundError:
+    img = _load_map()
+    if img is None:
         print(f"Error: Map image not found at {MAP_IMAGE_PATH}")
         return None
 
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(10, 10))
+    # A standalone Figure (not pyplot) so the map can be rendered from a worker thread
+    fig = Figure(figsize=(8, 8))
+    ax = _dark_map_axes(fig)
     ax.imshow(img, extent=[0, 15000, 0, 15000])
 
+    # One structured array for every event, flagged by whether it was a death
+    events = np.array(
+        [(e['position']['x'], e['position']['y'], is_death)
+         for is_death, group in ((False, combat_events), (True, death_events))
+         for e in group if 'position' in e],
+        dtype=[('x', np.float32), ('y', np.float32), ('death', np.bool_)]
+    )
+    deaths = events['death']
+
     # Plot Kills and Assists in Blue
-    kx = [e['position']['x'] for e in combat_events if 'position' in e]
-    ky = [e['position']['y'] for e in combat_events if 'position' in e]
-    ax.scatter(kx, ky, color='cyan', s=80, alpha=0.8, marker='+', label='Kills/Assists')
+    ax.scatter(events['x'][~deaths], events['y'][~deaths], color='cyan', s=80, alpha=0.8, marker='+', label='Kills/Assists')
 
     # Plot Deaths in Red
-    dx = [e['position']['x'] for e in death_events if 'position' in e]
-    dy = [e['position']['y'] for e in death_events if 'position' in e]
-    ax.scatter(dx, dy, color='red', s=100, alpha=0.8, marker='x', label='Deaths')
+    ax.scatter(events['x'][deaths], events['y'][deaths], color='red', s=100, alpha=0.8, marker='x', label='Deaths')
 
-    ax.set_title(f"Combat Positioning Map - {match_id}")
+    ax.set_title(f"Combat Positioning Map - {match_id}", color='white')
     ax.set_xlim(0, 15000)
     ax.set_ylim(0, 15000)
-    ax.legend()
-    plt.xticks([])
-    plt.yticks([])
+    ax.legend(facecolor='black', labelcolor='white')
+    ax.set_xticks([])
+    ax.set_yticks([])
 
     output_filename = f"{match_id}_combat_map.png"
     output_path = os.path.join(OUTPUT_DIR, output_filename)
-    plt.savefig(output_path, bbox_inches='tight', dpi=200)
-    plt.close(fig)
+    fig.savefig(output_path, bbox_inches='tight', dpi=STATIC_MAP_DPI, facecolor='black', pil_kwargs=PNG_SAVE_KWARGS)
     print(f"Combat map saved to {output_path}")
     
     return output_path
 
+@_reuse_saved_plot
 def plot_pathing_map(match_data: dict) -> str | None:
     """
     (Upgraded) Creates and saves a map showing the player's full path,
@@ -200,32 +329,32 @@ def plot_pathing_map(match_data: dict) -> str | None:
     # ... (The logic for segmenting the path and setting up the plot is the same)
     EARLY_GAME_END = 14 * 60 * 1000
     MID_GAME_END = 25 * 60 * 1000
-    early_path = [p['position'] for p in pathing_data if p['timestamp'] <= EARLY_GAME_END]
-    mid_path = [p['position'] for p in pathing_data if EARLY_GAME_END < p['timestamp'] <= MID_GAME_END]
-    late_path = [p['position'] for p in pathing_data if p['timestamp'] > MID_GAME_END]
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(10, 10))
-    ax.set_title(f"Full Game Pathing Map - Champion: {match_data.get('champion', 'N/A')}")
-    plt.xticks([]); plt.yticks([])
-    try:
-        img = mpimg.imread(MAP_IMAGE_PATH)
+    ts, xy = _pathing_to_arrays(pathing_data)
+    early_path = xy[ts <= EARLY_GAME_END]
+    mid_path = xy[(ts > EARLY_GAME_END) & (ts <= MID_GAME_END)]
+    late_path = xy[ts > MID_GAME_END]
+    fig = Figure(figsize=(8, 8))
+    ax = _dark_map_axes(fig)
+    ax.set_title(f"Full Game Pathing Map - Champion: {match_data.get('champion', 'N/A')}", color='white')
+    ax.set_xticks([]); ax.set_yticks([])
+    img = _load_map()
+    if img is not None:
         ax.imshow(img, extent=[0, 15000, 0, 15000])
-    except FileNotFoundError:
+    else:
         print(f"Warning: Map image not found at {MAP_IMAGE_PATH}")
     if len(early_path) > 1:
-        x, y = zip(*[(p['x'], p['y']) for p in early_path]); ax.plot(x, y, color='#e6e600', linewidth=2, label='Early Game (0-14m)', alpha=0.8)
+        ax.plot(early_path[:, 0], early_path[:, 1], color='#e6e600', linewidth=2, label='Early Game (0-14m)', alpha=0.8)
     if len(mid_path) > 1:
-        x, y = zip(*[(p['x'], p['y']) for p in mid_path]); ax.plot(x, y, color='#00e6e6', linewidth=2.5, label='Mid Game (14-25m)', alpha=0.9)
+        ax.plot(mid_path[:, 0], mid_path[:, 1], color='#00e6e6', linewidth=2.5, label='Mid Game (14-25m)', alpha=0.9)
     if len(late_path) > 1:
-        x, y = zip(*[(p['x'], p['y']) for p in late_path]); ax.plot(x, y, color='#ff3333', linewidth=3, label='Late Game (25m+)', alpha=1.0)
-    ax.legend(loc="upper right", facecolor="black", framealpha=0.7)
+        ax.plot(late_path[:, 0], late_path[:, 1], color='#ff3333', linewidth=3, label='Late Game (25m+)', alpha=1.0)
+    ax.legend(loc="upper right", facecolor="black", labelcolor='white', framealpha=0.7)
     ax.set_xlim(0, 15000); ax.set_ylim(0, 15000)
 
     # --- NEW: Save the file and return the path ---
     output_filename = f"{match_id}_pathing_map.png"
     output_path = os.path.join(OUTPUT_DIR, output_filename)
-    plt.savefig(output_path, bbox_inches='tight', dpi=200)
-    plt.close(fig)
+    fig.savefig(output_path, bbox_inches='tight', dpi=STATIC_MAP_DPI, facecolor='black', pil_kwargs=PNG_SAVE_KWARGS)
     print(f"Pathing map saved to {output_path}")
     return output_path
 
@@ -1,70 +1,106 @@
+import os
+import orjson
 import logging
-from .riot_api import RiotAPIClient
-from src.analysis.analysis import extract_support_stats, analyze_match_timeline
+import asyncio
+from .riot_api import AsyncRiotAPIClient
+from src.analysis.analysis import extract_support_match, index_participants
+from src.utils.utils import load_json
 
 # Set up logger
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+USER_DATA_DIR = "data/users/"
+
+def _get_non_support_filepath(game_name: str, tag_line: str) -> str:
+    """ Sidecar file listing the match IDs already known not to be support games. """
+    sanitized_name = game_name.replace(" ", "_")
+    return os.path.join(USER_DATA_DIR, f"{sanitized_name}_{tag_line}_seen.json")
+
 # In agent/live_fetcher.py
 
-def fetch_and_analyze_player_data(game_name: str, tag_line: str, region: str, num_games: int = 20) -> list[dict] | str:
+def fetch_and_analyze_player_data(game_name: str, tag_line: str, region: str, num_games: int = 20,
+                                  queue: int = None, match_type: str = None) -> list[dict] | str:
     """
     Fetches and analyzes recent support games for a given player.
+    `queue` and `match_type` optionally narrow the match history server-side.
     Returns a list of analyzed matches, or a string code indicating the error.
     """
+    return asyncio.run(fetch_and_analyze_player_data_async(game_name, tag_line, region, num_games, queue, match_type))
+
+
+async def fetch_and_analyze_player_data_async(game_name: str, tag_line: str, region: str, num_games: int = 20,
+                                              queue: int = None, match_type: str = None) -> list[dict] | str:
+    """
+    Async version of fetch_and_analyze_player_data. Match details and timelines
+    are requested concurrently over a shared HTTP/2 connection.
+    """
     try:
-        riot_client = RiotAPIClient()
+        riot_client = AsyncRiotAPIClient()
     except ValueError as e:
         logger.error(f"Failed to initialize Riot API Client: {e}")
         return "API_KEY_ERROR"
 
-    # 1. Get PUUID from Riot ID
-    logger.info(f"Fetching PUUID for {game_name}#{tag_line}...")
-    account_data = riot_client.get_account_by_riot_id(game_name, tag_line, region)
-    if not account_data or "puuid" not in account_data:
-        logger.error("Could not retrieve PUUID. Check Riot ID and region.")
-        return "PLAYER_NOT_FOUND" # <-- Specific status code
-    puuid = account_data["puuid"]
-
-    # 2. Get recent match IDs
-    logger.info(f"Fetching recent match IDs for PUUID {puuid}...")
-    match_ids = riot_client.get_match_ids_by_puuid(puuid, region, count=num_games)
-    if not match_ids:
-        logger.warning("No recent matches found for this player.")
-        return [] # Return an empty list, not an error
-
-    # 3. Process each match
-    analyzed_games = []
-    # ... (the rest of the function is the same) ...
-    for mid in match_ids:
-        match_detail = riot_client.get_match_detail(mid, region)
-        if not match_detail:
-            continue
+    async with riot_client:
+        # 1. Get PUUID from Riot ID
+        logger.info(f"Fetching PUUID for {game_name}#{tag_line}...")
+        account_data = await riot_client.get_account_by_riot_id(game_name, tag_line, region)
+        if not account_data or "puuid" not in account_data:
+            logger.error("Could not retrieve PUUID. Check Riot ID and region.")
+            return "PLAYER_NOT_FOUND" # <-- Specific status code
+        puuid = account_data["puuid"]
+
+        # 2. Get recent match IDs
+        logger.info(f"Fetching recent match IDs for PUUID {puuid}...")
+        match_ids = await riot_client.get_match_ids_by_puuid(puuid, region, count=num_games, queue=queue, match_type=match_type)
+        if not match_ids:
+            logger.warning("No recent matches found for this player.")
+            return [] # Return an empty list, not an error
+
+        # Skip games a previous run already classified as non-support
+        non_support_path = _get_non_support_filepath(game_name, tag_line)
+        known_non_support = set(load_json(non_support_path)) if os.path.exists(non_support_path) else set()
+        match_ids = [mid for mid in match_ids if mid not in known_non_support]
+        new_non_support = []
 
-        participant_info = next((p for p in match_detail["info"]["participants"] if p.get("puuid") == puuid), None)
-        
-        if participant_info and participant_info.get("teamPosition") == "UTILITY":
-            logger.info(f"Found support game {mid}. Fetching timeline...")
-            timeline_data = riot_client.get_match_timeline(mid, region)
-            if not timeline_data:
-                logger.warning(f"Could not fetch timeline for {mid}.")
+        # 3. Fetch all match details concurrently, then keep only the support games
+        match_details = await asyncio.gather(*(riot_client.get_match_detail(mid, region) for mid in match_ids))
+
+        support_matches = []
+        for mid, match_detail in zip(match_ids, match_details):
+            if not match_detail:
                 continue
 
-            stats = extract_support_stats([match_detail], puuid)[0]
-            
-            p_id = participant_info.get("participantId")
-            team_id = participant_info.get("teamId")
-            timeline_analysis = analyze_match_timeline(timeline_data, p_id, team_id)
-
-            # Combine all data sources for a complete record
-            combined_match_data = {
-                **stats, 
-                **timeline_analysis,
-                "allParticipants": match_detail["info"]["participants"], # <-- THE FIX
-                "gameDuration": match_detail["info"]["gameDuration"]   # <-- Also useful
-            }
-            analyzed_games.append(combined_match_data)
+            participant_info = index_participants(match_detail).get(puuid)
+
+            if participant_info and participant_info.get("teamPosition") == "UTILITY":
+                logger.info(f"Found support game {mid}.")
+                support_matches.append((mid, match_detail, participant_info))
+            else:
+                new_non_support.append(mid)
+
+        # 4. Fetch the timelines of the support games concurrently
+        logger.info(f"Fetching timelines for {len(support_matches)} support games...")
+        timelines = await asyncio.gather(*(riot_client.get_match_timeline(mid, region) for mid, _, _ in support_matches))
+
+    if new_non_support:
+        os.makedirs(USER_DATA_DIR, exist_ok=True)
+        with open(non_support_path, 'wb') as f:
+            f.write(orjson.dumps(sorted(known_non_support.union(new_non_support))))
+
+    # 5. Analyze each support game
+    analyzed_games = []
+    for (mid, match_detail, participant_info), timeline_data in zip(support_matches, timelines):
+        if not timeline_data:
+            logger.warning(f"Could not fetch timeline for {mid}.")
+            continue
+
+        # Stats and timeline analysis come back as one record
+        combined_match_data = extract_support_match(match_detail, timeline_data, participant_info)
+        combined_match_data["allParticipants"] = match_detail["info"]["participants"] # <-- THE FIX
+        combined_match_data["gameDuration"] = match_detail["info"]["gameDuration"]   # <-- Also useful
+        analyzed_games.append(combined_match_data)
     
     logger.info(f"Successfully analyzed {len(analyzed_games)} support games.")
-    return analyzed_games
\ No newline at end of file
+    return analyzed_games
+
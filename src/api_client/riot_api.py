@@ -1,14 +1,47 @@
 # In agent/riot_api.py
 import requests
+import httpx
+import asyncio
 import os
+import hashlib
+import orjson
 import logging
 import time
+import threading
+from collections import deque, OrderedDict
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import quote
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 logger = logging.getLogger(__name__)
 
+# --- Response cache settings ---
+# Finished matches never change, so their details and timelines can be kept for a long time.
+MATCH_CACHE_TTL = 30 * 24 * 60 * 60
+# Account and match-history lookups change as new games are played.
+LOOKUP_CACHE_TTL = 5 * 60
+# Upper bound for the in-process fallback cache. Kept small: parsed match details
+# are large, and small hosts (e.g. 512 MB instances) can't afford hundreds of them.
+# Timelines (several MB each) skip the local cache entirely; they are fetched
+# once per match and the analysed result is persisted to disk anyway.
+LOCAL_CACHE_MAX_ENTRIES = 32
+
+# --- Transient server errors ---
+# Retried with exponential backoff (0.5s, 1s, 2s, ...) by both clients; 429s are handled separately.
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+SERVER_ERROR_BACKOFF = 0.5
+
 class RiotAPIClient:
+    # Shared by every client in the process, used when Redis is not configured
+    _local_cache = OrderedDict()
+    _local_cache_lock = threading.Lock()
+
     def __init__(self):
         # --- NEW: Explicitly load the .env file from the project root ---
         # This builds a path from this file's location up one level to the project root
@@ -26,11 +59,120 @@ class RiotAPIClient:
         
         self.headers = {"X-Riot-Token": self.api_key}
         self.session = requests.Session()
+        # Keep a pool of connections open so concurrent callers can reuse them.
+        # Transient 5xx errors are retried with backoff by urllib3; 429s stay with _request,
+        # which honours Retry-After and the rate-limit bookkeeping.
+        server_error_retry = Retry(total=3, backoff_factor=SERVER_ERROR_BACKOFF, status_forcelist=list(SERVER_ERROR_STATUSES),
+                                   allowed_methods=["GET"], raise_on_status=False)
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=server_error_retry))
+        # Fallback wait when a 429 response carries no Retry-After header
         self.rate_limit_delay = 1.5
         self.max_retries = 3
+        # Riot's default app limits as (max_requests, window_seconds).
+        # They are refreshed from the X-App-Rate-Limit header of each response.
+        self.rate_limits = [(20, 1.0), (100, 120.0)]
+        self._request_times = deque()
+        self._rate_lock = threading.Lock()
+
+        # --- Response cache: Redis when REDIS_URL is set, otherwise in-process ---
+        self.redis = None
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            if redis is None:
+                logger.warning("REDIS_URL is set but the redis package is not installed. Using the in-process cache.")
+            else:
+                self.redis = redis.Redis.from_url(redis_url)
+        # Caps the number of requests in flight across all threads sharing this client
+        self.max_concurrent_requests = 10
+        self._in_flight = threading.BoundedSemaphore(self.max_concurrent_requests)
+
+    def _acquire_rate_limit_slot(self):
+        """
+        Blocks until one more request fits inside every rate-limit window,
+        then records it. Waiting happens before sending instead of after a 429.
+        """
+        with self._rate_lock:
+            while True:
+                now = time.monotonic()
+                longest_window = max(window for _, window in self.rate_limits)
+                while self._request_times and self._request_times[0] <= now - longest_window:
+                    self._request_times.popleft()
+
+                wait = 0.0
+                for limit, window in self.rate_limits:
+                    recent = [t for t in self._request_times if t > now - window]
+                    if len(recent) >= limit:
+                        # Wait until the oldest request counting against this limit expires
+                        wait = max(wait, recent[-limit] + window - now)
+
+                if wait <= 0:
+                    self._request_times.append(now)
+                    return
+                logger.debug(f"Rate limit reached. Waiting {wait:.2f} seconds before sending...")
+                time.sleep(wait)
+
+    def _update_rate_limits(self, header_value: str | None):
+        """ Parses an X-App-Rate-Limit header such as '20:1,100:120'. """
+        if not header_value:
+            return
+        try:
+            limits = [(int(limit), float(window)) for limit, window in
+                      (pair.split(":") for pair in header_value.split(","))]
+        except ValueError:
+            logger.warning(f"Could not parse rate limit header: {header_value}")
+            return
+        if limits:
+            with self._rate_lock:
+                self.rate_limits = limits
+
+    @staticmethod
+    def _cache_key(url: str, params: dict | None) -> str:
+        raw = url.encode() + orjson.dumps(params or {}, option=orjson.OPT_SORT_KEYS)
+        return "riot:" + hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def _cache_get(self, key: str):
+        if self.redis is not None:
+            try:
+                cached = self.redis.get(key)
+            except redis.RedisError as e:
+                logger.warning(f"Redis lookup failed, skipping cache: {e}")
+                return None
+            return orjson.loads(cached) if cached is not None else None
+
+        with self._local_cache_lock:
+            entry = self._local_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._local_cache[key]
+                return None
+            self._local_cache.move_to_end(key)
+            return data
+
+    def _cache_set(self, key: str, data, ttl: int, cache_locally: bool = True):
+        if self.redis is not None:
+            try:
+                self.redis.setex(key, ttl, orjson.dumps(data))
+            except redis.RedisError as e:
+                logger.warning(f"Redis write failed, response not cached: {e}")
+            return
+        if not cache_locally: return
+
+        with self._local_cache_lock:
+            self._local_cache[key] = (time.monotonic() + ttl, data)
+            self._local_cache.move_to_end(key)
+            while len(self._local_cache) > LOCAL_CACHE_MAX_ENTRIES:
+                self._local_cache.popitem(last=False)
+
+    def _request(self, url: str, params: dict = None, ttl: int = LOOKUP_CACHE_TTL,
+                 cache_locally: bool = True) -> dict | None:
+        cache_key = self._cache_key(url, params)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            logger.debug(f"Cache hit for URL: {url}")
+            return cached
 
-    # The _request method and all other get_... methods remain exactly the same.
-    def _request(self, url: str, params: dict = None) -> dict | None:
         retries = 0
         while retries < self.max_retries:
             try:
@@ -38,13 +180,22 @@ class RiotAPIClient:
                 logger.debug(f"With headers: {self.headers}")
                 if params:
                     logger.debug(f"With params: {params}")
-                response = self.session.get(url, headers=self.headers, params=params, timeout=15)
+                self._acquire_rate_limit_slot()
+                with self._in_flight:
+                    response = self.session.get(url, headers=self.headers, params=params, timeout=15)
+                self._update_rate_limits(response.headers.get("X-App-Rate-Limit"))
                 response.raise_for_status()
-                return response.json()
+                # orjson decodes the raw bytes directly, much faster on large timelines
+                data = orjson.loads(response.content)
+                self._cache_set(cache_key, data, ttl, cache_locally)
+                return data
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 429:
-                    logger.warning(f"Rate limit exceeded. Waiting {self.rate_limit_delay} seconds...")
-                    time.sleep(self.rate_limit_delay)
+                    # Riot tells us exactly how long to back off for
+                    retry_after = e.response.headers.get("Retry-After")
+                    delay = float(retry_after) if retry_after else self.rate_limit_delay
+                    logger.warning(f"Rate limit exceeded. Waiting {delay} seconds...")
+                    time.sleep(delay)
                     retries += 1
                     logger.info(f"Retrying... (Attempt {retries}/{self.max_retries})")
                 else:
@@ -63,15 +214,111 @@ class RiotAPIClient:
         account_url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{encoded_game_name}/{encoded_tag_line}"
         return self._request(account_url)
 
-    def get_match_ids_by_puuid(self, puuid: str, region: str, count: int = 20):
+    def get_match_ids_by_puuid(self, puuid: str, region: str, count: int = 20, queue: int = None, match_type: str = None):
         match_history_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
         params = {'start': 0, 'count': count}
+        # Let Riot filter the history server-side (e.g. queue=420 or match_type='ranked')
+        if queue is not None:
+            params['queue'] = queue
+        if match_type is not None:
+            params['type'] = match_type
         return self._request(match_history_url, params=params)
 
     def get_match_detail(self, match_id: str, region: str):
         match_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-        return self._request(match_url)
+        return self._request(match_url, ttl=MATCH_CACHE_TTL)
 
     def get_match_timeline(self, match_id: str, region: str):
         timeline_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
-        return self._request(timeline_url)
\ No newline at end of file
+        return self._request(timeline_url, ttl=MATCH_CACHE_TTL, cache_locally=False)
+
+
+class AsyncRiotAPIClient(RiotAPIClient):
+    """
+    Async twin of RiotAPIClient built on httpx. Requests share a single HTTP/2
+    connection per regional host instead of one TCP/TLS connection each, so
+    many match lookups can be multiplexed with asyncio.gather.
+    Reuses the key loading, response cache and rate limiter of the sync client.
+    Must be used as `async with AsyncRiotAPIClient() as client:`.
+    """
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(http2=True, headers=self.headers, timeout=15,
+                                        limits=httpx.Limits(max_connections=20))
+        self._async_in_flight = asyncio.Semaphore(self.max_concurrent_requests)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.client.aclose()
+
+    async def _request(self, url: str, params: dict = None, ttl: int = LOOKUP_CACHE_TTL,
+                       cache_locally: bool = True) -> dict | None:
+        cache_key = self._cache_key(url, params)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            logger.debug(f"Cache hit for URL: {url}")
+            return cached
+
+        retries = 0
+        while retries < self.max_retries:
+            try:
+                logger.debug(f"Making async request to URL: {url}")
+                if params:
+                    logger.debug(f"With params: {params}")
+                # The limiter blocks on a threading lock, so wait for it off the event loop
+                await asyncio.to_thread(self._acquire_rate_limit_slot)
+                async with self._async_in_flight:
+                    response = await self.client.get(url, params=params)
+                self._update_rate_limits(response.headers.get("X-App-Rate-Limit"))
+                response.raise_for_status()
+                data = orjson.loads(response.content)
+                self._cache_set(cache_key, data, ttl, cache_locally)
+                return data
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 429:
+                    retry_after = e.response.headers.get("Retry-After")
+                    delay = float(retry_after) if retry_after else self.rate_limit_delay
+                    logger.warning(f"Rate limit exceeded. Waiting {delay} seconds...")
+                    await asyncio.sleep(delay)
+                    retries += 1
+                    logger.info(f"Retrying... (Attempt {retries}/{self.max_retries})")
+                elif e.response.status_code in SERVER_ERROR_STATUSES:
+                    # Transient Riot outage: back off exponentially, same schedule as the sync client's Retry
+                    retries += 1
+                    if retries >= self.max_retries: break
+                    delay = SERVER_ERROR_BACKOFF * (2 ** (retries - 1))
+                    logger.warning(f"Server error {e.response.status_code} for URL {url}. Waiting {delay} seconds...")
+                    await asyncio.sleep(delay)
+                    logger.info(f"Retrying... (Attempt {retries}/{self.max_retries})")
+                else:
+                    logger.error(f"HTTP Error for URL {url}: {e}")
+                    logger.error(f"Response body: {e.response.text}")
+                    return None
+            except httpx.HTTPError as e:
+                logger.error(f"Request failed for URL {url}: {e}")
+                return None
+        logger.error(f"Failed to fetch data from {url} after {self.max_retries} retries.")
+        return None
+
+    async def get_account_by_riot_id(self, game_name: str, tag_line: str, region: str):
+        encoded_game_name = quote(game_name)
+        encoded_tag_line = quote(tag_line)
+        account_url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{encoded_game_name}/{encoded_tag_line}"
+        return await self._request(account_url)
+
+    async def get_match_ids_by_puuid(self, puuid: str, region: str, count: int = 20, queue: int = None, match_type: str = None):
+        match_history_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
+        params = {'start': 0, 'count': count}
+        if queue is not None:
+            params['queue'] = queue
+        if match_type is not None:
+            params['type'] = match_type
+        return await self._request(match_history_url, params=params)
+
+    async def get_match_detail(self, match_id: str, region: str):
+        match_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+        return await self._request(match_url, ttl=MATCH_CACHE_TTL)
+
+    async def get_match_timeline(self, match_id: str, region: str):
+        timeline_url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
+        return await self._request(timeline_url, ttl=MATCH_CACHE_TTL, cache_locally=False)
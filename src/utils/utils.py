@@ -5,9 +5,10 @@ This module provides helper functions for common tasks like reading data
 from files, ensuring that this logic is centralized and reusable.
 """
 
-import json
+import os
+import orjson
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 
 # Set up a logger for this module
 logger = logging.getLogger(__name__)
@@ -24,14 +25,60 @@ def load_json(file_path: str) -> List[Dict[str, Any]]:
         if the file is not found or contains invalid JSON.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # orjson parses the raw bytes directly and is several times faster than json.load
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
     except FileNotFoundError:
         logger.warning(f"File not found: {file_path}. Returning empty list.")
         return []
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.error(f"Failed to decode JSON from {file_path}. Returning empty list.")
         return []
     except Exception as e:
         logger.error(f"An unexpected error occurred loading {file_path}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def write_json_array(file_path: str, items: Iterable[Any], pretty: bool = True) -> int:
+    """
+    Writes items to a JSON array file one element at a time, so the full list
+    never has to be held in memory.
+
+    The bytes match orjson.dumps(list(items), option=orjson.OPT_INDENT_2), so
+    existing readers and committed data files are unaffected. With
+    pretty=False they match the compact orjson.dumps(list(items)) instead.
+
+    The array is streamed into a temporary file that only replaces `file_path`
+    once every item is written, so a failure part-way leaves the old file intact.
+
+    Args:
+        file_path: The path to write the JSON array to.
+        items: Any iterable of JSON-serializable items (a generator works).
+        pretty: Indent the output. Turn off for machine-read files.
+
+    Returns:
+        The number of items written.
+    """
+    count = 0
+    tmp_path = file_path + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b"[")
+            if pretty:
+                for item in items:
+                    # JSON strings can't hold raw newlines, so this only shifts the indentation one level
+                    body = orjson.dumps(item, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  ")
+                    f.write((b",\n  " if count else b"\n  ") + body)
+                    count += 1
+                f.write(b"\n]" if count else b"]")
+            else:
+                for item in items:
+                    f.write((b"," if count else b"") + orjson.dumps(item))
+                    count += 1
+                f.write(b"]")
+    except BaseException:
+        # Don't leave a partial temp file behind; the original file is untouched
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, file_path)
+    return count
@@ -36,7 +36,7 @@ else:
     
     try:
         # 5. Make the API call
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=5)
         
         # 6. Print the results
         print(f"\n--- RESULTS ---")